@@ -7,8 +7,8 @@ This script runs the full myopic modeling process for a PyPSA-based power system
     
     
 Process:
-    1) It reads user inputs (clusters, regional potential).
-    2) Loads the configuration YAML (common settings).
+    1) Loads the configuration YAML (common settings) and applies overrides.
+    2) Reads the run settings (clusters, years, output folder).
     3) Loads a PyPSA network from the "Networks" folder*
     4) Processes data (if needed), then sets up the baseline scenario**
     5) Iterates year by year, applying expansions, retirements, re-optimizations.
@@ -25,48 +25,95 @@ You should have:
 """
 
 import os
+import argparse
 import logging
 import pandas as pd
 import yaml
 import pypsa
 import warnings
 
-import Model_Code.data_processing as dp
 import Model_Code.base_functions as bf
 import Model_Code.Myopic as mp
 import Model_Code.plotting as pt
 import Model_Code.H2_Ready as H2R
+import Model_Code.solving as sv
+import Model_Code.checkpoint as ck
+import Model_Code.vintage as vt
+import Model_Code.roles as rl
+import Model_Code.costs as cs
+import Model_Code.utils as ut
+import Model_Code.time_aggregation as ta
+import Model_Code.profiling as pf
+import Model_Code.cache as ch
+import Model_Code.baseline as bl
 
-from Model_Code.Constraints import extra_functionality
 warnings.filterwarnings("ignore")
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Last year of the myopic optimization. The cost and demand trajectories and
+# the phase-out schedule cover all years up to it, so a run resumed from a
+# checkpoint can go beyond the end_year of the run that wrote it.
+LAST_YEAR = 2050
 
-def main():
+
+def main(config_path='config.yaml', clusters=None, end_year=2050,
+         output_dir=None, overrides=None, resume_from=None, config=None):
     """
-    Executes the myopic optimization from user input to final output files.
+    Executes the myopic optimization from the configuration to final output files.
+
+    Parameters:
+    -----------
+    config_path : str, optional
+        Path of the configuration file. Default is 'config.yaml'.
+    clusters : int, optional
+        Number of clusters of the network. Default is the 'clusters' value
+        of the scenario settings.
+    end_year : int, optional
+        Last year of the myopic optimization, between 2021 and 2050.
+    output_dir : str, optional
+        Folder for results and checkpoints. Default is 'Results/<clusters>';
+        concurrent runs must use separate folders.
+    overrides : dict, optional
+        Configuration values to replace, keyed by dotted names
+        (e.g. {'scenario_settings.H2_import': False}).
+    resume_from : int, optional
+        Year to resume the myopic optimization from. The checkpoint of the
+        previous year is restored instead of setting up the 2020 baseline.
+    config : dict, optional
+        An already loaded configuration, used instead of reading config_path.
+
+    Returns:
+    --------
+    dict
+        The result tables of the run (bar tables, additions, potentials)
+        and the output folder.
     """
 
     # Read config.yaml
-    with open(r'config.yaml', "r") as file:
-        config = yaml.load(file, Loader=yaml.FullLoader)
+    if config is None:
+        with open(config_path, "r") as file:
+            config = yaml.load(file, Loader=yaml.FullLoader)
+    config = ut.apply_overrides(config, overrides)
+    # Stage timings of the run, see Model_Code/profiling.py
+    profile = [] if config.get('profile', False) else None
 
     opts = config['scenario_settings']['opts'][0].split('-')
-    solver_options = config['solving']['solver'].copy()
-    tmpdir = config['solving'].get('tmpdir')
     colors=config['plotting']['tech_colors']
 
     #extract scenario settings
     scenario_settings = config.get("scenario_settings", {})
-    print('enter clusters')
-    clusters = int(input())    # default to 4 if not alligned with NUTS
-    clusters = clusters if clusters in [4,13,37,194] else \
-        scenario_settings.get("clusters")
+    # default to the config value if not alligned with NUTS
+    if clusters not in [4,13,37,194]:
+        if clusters is not None:
+            logger.warning(f"No NUTS network with {clusters} clusters, "
+                           f"using {scenario_settings.get('clusters')}")
+        clusters = scenario_settings.get("clusters")
+    start = 2021 if resume_from is None else resume_from
+    if not start <= end_year <= LAST_YEAR:
+        raise ValueError(f"end_year must be between {start} and {LAST_YEAR}, got {end_year}")
     regional_potential = scenario_settings.get("regional_potential")[clusters]
-    #demand_growth = scenario_settings.get("demand_growth", 1.0)
-    # Possibly more, e.g. co2_price or co2_limit,demand_growth (still not implemented)
     logger.info("Using config-based scenario settings:")
     logger.info(f" clusters={clusters}, regional_potential={regional_potential}")
 
@@ -76,29 +123,20 @@ def main():
     if not os.path.exists(network_filename):
         raise FileNotFoundError(f"Cannot find network file: {network_filename}")
 
-    # Load the PyPSA Network
-    n = pypsa.Network(network_filename)
-    n.generators["p_nom_min"] = 0
-
     # Create results folder(s)
     # For example, strip the ".nc" from network file for one folder,
     # and also create a folder named after the number of buses:
     name = network_filename[:-3]  # e.g. "Networks/elec_s_3_ec_lcopt_Co2L-1H-Ep-CCL"
-    bf.createFolder(name)
-
-    bus_folder = 'Results/'+str(int(len(n.buses)))
+    bus_folder = output_dir or 'Results/'+str(clusters)
     bf.createFolder(bus_folder)
-
-    # Update renewable profiles, availability, etc.
-    dp.update_rens_profiles(n, reference_year=2013, name=name)
-    bf.update_availability_profiles(n, name)
-
+    checkpoint_dir = f"{bus_folder}/checkpoints"
 
     # Read input data / CSVs from inside the
     co2lims = pd.read_csv(os.path.join("data", "co2limits.csv"))
     cost_factors = pd.read_csv(os.path.join("data", "Cost_Factor.csv"), index_col=0, header=0)
     fuel_cost = pd.read_csv(os.path.join("data", "fuel_cost.csv"), index_col=0, header=0)
     co2price = pd.read_csv(os.path.join("data", "co2_price.csv"), index_col=0)
+    co2price = mp.co2price_trajectory(co2price, scenario_settings.get("co2_price"))
 
     # Additional data to store scenario settings
     agg_p_nom_minmax = pd.read_csv(config['scenario_settings']\
@@ -123,218 +161,253 @@ def main():
     txt = pd.DataFrame({"val": val}, index=var)
     txt.to_excel(f"{bus_folder}/Scenario_settings.xlsx", index=True)
 
-    # Read or create removal data (conventional, RES, biomass, coal, etc.)
-    def read_data(n, folder_name):
-        conventional_base = dp.Base_Removal_Data(n,folder_name)
-
-        if os.path.exists(f"{folder_name}/res_basic_removal.csv"):
-            RES_base_remove = pd.read_csv(f"{folder_name}/res_basic_removal.csv", index_col=0)
-        else:
-            _, RES_base_remove = dp.RES_data(n, folder_name)
-
-        if os.path.exists(f"{folder_name}/res_basic_addition.csv"):
-            RES_base_addition = pd.read_csv(f"{folder_name}/res_basic_addition.csv", index_col=0)
+    def loop_state():
+        """The tables of the loop stored in a checkpoint, in the order of ck.STATE_KEYS."""
+        return dict(zip(ck.STATE_KEYS,
+                        (last_year, ledger, costs, demand, saved_potential, Potentials_over_years,
+                         gen_bar, inst_bar, store_bar, ren_perc,
+                         removal_data, conventional_base, renewables, phase_out)))
+
+    if resume_from is None:
+        bf.createFolder(name)
+        # Years covered by the trajectories and the phase-out schedule
+        last_year = LAST_YEAR
+        cache_settings = config.get('cache', {})
+        cache_dir = cache_settings.get('dir', 'cache')
+        baseline = None
+        if cache_settings.get('baseline', False):
+            with pf.stage(profile, 'baseline_key'):
+                key = ch.baseline_key(network_filename, {'clusters': clusters})
+            baseline = ch.load_baseline(cache_dir, key)
+
+        if baseline is not None:
+            n, state = baseline
         else:
-            RES_base_addition, _ = dp.RES_data(n, folder_name)
-
-        return conventional_base, RES_base_remove, RES_base_addition
-
-    Bio_data = dp.Biomass_data(n, name)
-    conventional_base, RES_base_remove, RES_base_addition = read_data(n, name)
-    coal_data = dp.Correct_coal(n, name)
-
-    # Combine data
-    conventional_base = pd.concat([conventional_base, coal_data])
-    conventional_base = pd.concat([conventional_base, Bio_data])
-    removal_data = pd.concat([conventional_base, RES_base_remove])
-    removal_data.to_csv(f"{bus_folder}/All_removal_data.csv")
-    # Make Coal/Lignite removed only based on linear phase-out
-    xs=conventional_base.loc[(conventional_base.carrier=='lignite')
-                          |
-                          (conventional_base.carrier=='coal')].index
-    conventional_base.drop(xs,inplace=True)
-    # Phase-out initialization: e.g., coal by 2038, lignite by 2036
-    phase_out_removal, yearly_phase_out = mp.Phase_out(n, 'coal', 2038)
-    phase_out_removal_lignite, yearly_phase_out_lignite = mp.Phase_out(n, 'lignite', 2038)
-    
-    # Example: separate out renewables
-    renewables = pd.concat([
-        removal_data[removal_data.carrier=='solar'],
-        removal_data[removal_data.carrier=='onwind'],
-        removal_data[removal_data.carrier=='offwind-ac'],
-        removal_data[removal_data.carrier=='offwind-dc']
-    ])
-    
+            n, state = bl.prepare_baseline(network_filename, name, fuel_cost)
+            if cache_settings.get('baseline', False):
+                # Key again: the first build writes the removal data to the network folder
+                key = ch.baseline_key(network_filename, {'clusters': clusters})
+                ch.save_baseline(cache_dir, key, n, state)
+        ledger, removal_data, conventional_base, renewables = \
+            (state[k] for k in ch.BASELINE_KEYS)
+
+        removal_data.to_csv(f"{bus_folder}/All_removal_data.csv")
+        # Phase-out schedule of the plants of every carrier, e.g. coal by 2038
+        phase_out = mp.phase_out_schedule(n, scenario_settings.get('phase_out', {'coal': 2038, 'lignite': 2038}),
+                                          range(2021, last_year + 1))
+        phase_out.to_csv(f"{bus_folder}/phase_out_schedule.csv")
+
+        # Role index of the baseline components (CCGT, H2 links, Fixed twins, ...)
+        rl.build_roles(n)
+
+        # Set CO2 limit and price of 2020
+        mp.update_co2limit(n, int(co2lims.co2limit[co2lims.year == 2020]))
+        mp.update_co2price(n, year=2020, co2price=co2price)
+
+        # Setup arrays for result tracking
+        ren_perc = []
+
+        # Setup DFs for result tracking
+        gen_bar = pd.DataFrame(index=range(2020, end_year + 1), columns=list(n.generators.carrier.unique()))
+        inst_bar = pd.DataFrame(index=range(2020, end_year + 1),
+                                columns=list(n.generators.carrier[n.generators.carrier!='load'].unique()))
+        store_bar = pd.DataFrame(index=range(2020, end_year + 1), columns=list(n.storage_units.carrier.unique()))
+
+        # Turn off cyclic SoC ==> Done Manually
+        n.storage_units.cyclic_state_of_charge = False
+
+        # Manage Regional and Yearly potential
+        saved_potential = n.generators.p_nom_max[n.generators.p_nom_extendable == True]
+        saved_potential = mp.Yearly_potential(n, saved_potential, regional_potential,agg_p_nom_minmax=agg_p_nom_minmax)
+
+        # Aggregate the snapshots following the opts, e.g. 24H or 12days
+        ta.aggregate_snapshots(n, opts)
+
+        # Store constraints for store e_max ==> empty at last snapshot
+        p_max_pu_store = pd.DataFrame(1, index=n.snapshots, columns=n.stores.index)
+        p_max_pu_store.iloc[-1] = 0
+        n.pnl("Store")["e_max_pu"] = p_max_pu_store
+
+
+        # H2 Imports: Scenario based
+        n.generators.\
+            loc[n.generators.carrier=='H2',\
+                'p_nom_extendable'] = scenario_settings.get("H2_import")
+        # Stop H2-Gas Mixing in CCGT: Scenario based
+        n.links.\
+            loc[rl.role_names(n, 'H2_input'),\
+                'p_nom_extendable'] = scenario_settings.get("H2_ready")
+        if not scenario_settings.get('H2_ready'):
+            ccgt = rl.role_names(n, 'CCGT')
+            n.links.loc[ccgt,'bus0'] = n.links.loc[ccgt,'bus1'] + " gas"
     
+        # Incentivize Hydrogen: Scenario based
+        if scenario_settings.get('H2_ready') \
+            and scenario_settings.get('H2_ready_OPEX'):
+                for tech in scenario_settings.get('H2_OPEX_support').keys():
+                    H2R.H2_Ready_opex(n,
+                                      total_support=\
+                                          scenario_settings\
+                                              .get('H2_OPEX_support')[tech],
+                                              element=tech)
+
+        # Load profiles of every year: the 2020 profiles times the demand growth
+        demand = mp.demand_trajectory(n, scenario_settings.get('demand_growth', 0.01),
+                                      range(2021, last_year + 1), base_year=2020)
+
+        # Capital and marginal costs of all components for every year
+        costs = cs.cost_trajectories(n, range(2021, last_year + 1), cost_factors,
+                                     fuel_cost, co2price, base_year=2020)
+
+        # Solve network for 2020 
+        n.config = config
+        n.opts = opts
+        config["year"] = 2020
 
-    # Convert the network to a baseline:
-    df = bf.convert_opt_to_conv(n, 2020, RES_base_addition, name=name, fuel_cost=fuel_cost)
-    df_stor = bf.convert_opt_storage_to_conv(n, 2020)
-    df_H2, df_H2_store = bf.H2_ready(n, 2020, fuel_cost=fuel_cost)
-
-    # Update load, set CO2 limit, etc.
-    # Example: scale to match some absolute TWh
-    mp.update_load(n, 540 / (n.loads_t.p_set.sum().sum() / 1000000))
-    mp.update_co2limit(n, int(co2lims.co2limit[co2lims.year == 2020]))
-    mp.update_co2price(n, year=2020, co2price=co2price)
-
-    n.lines.s_max_pu = 1.0 # Relax transmission lines contingency limit
-
-    # Setup arrays for result tracking
-    ren_perc = []
-    n.storage_units.state_of_charge_initial = 0
-
-    # Add a large "load" generator with high marginal cost to avoid infeasibilities
-    n.add("Carrier", "Load")
-    n.madd("Generator",
-           n.buses.index[n.buses.carrier=='AC'],
-           " load",
-           bus=n.buses.index[n.buses.carrier=='AC'],
-           carrier='load',
-           marginal_cost=1e5,
-           p_nom=1e6
-           )
-
-    # Setup DFs for result tracking
-    gen_bar = pd.DataFrame(index=range(2020, 2051), columns=list(n.generators.carrier.unique()))
-    inst_bar = pd.DataFrame(index=range(2020, 2051),
-                            columns=list(n.generators.carrier[n.generators.carrier!='load'].unique()))
-    store_bar = pd.DataFrame(index=range(2020, 2051), columns=list(n.storage_units.carrier.unique()))
-
-    # Turn off cyclic SoC ==> Done Manually
-    n.storage_units.cyclic_state_of_charge = False
-
-    # Manage Regional and Yearly potential
-    saved_potential = n.generators.p_nom_max[n.generators.p_nom_extendable == True]
-    saved_potential = mp.Yearly_potential(n, saved_potential, regional_potential,agg_p_nom_minmax=agg_p_nom_minmax)
-
-    # Store constraints for store e_max ==> empty at last snapshot
-    p_max_pu_store = pd.DataFrame(1, index=n.snapshots, columns=n.stores.index)
-    p_max_pu_store.iloc[-1] = 0
-    n.pnl("Store")["e_max_pu"] = p_max_pu_store
-
-
-    # H2 Imports: Scenario based
-    n.generators.\
-        loc[n.generators.carrier=='H2',\
-            'p_nom_extendable'] = scenario_settings.get("H2_import")
-    # Stop H2-Gas Mixing in CCGT: Scenario based
-    n.links.\
-        loc[[elem for elem in n.links.index \
-             if 'H2_input' in elem],\
-            'p_nom_extendable'] = scenario_settings.get("H2_ready")
-    if not scenario_settings.get('H2_ready'):
-        for bus in n.buses.index[n.buses.carrier=='AC']:
-            n.links.loc[f"{bus} CCGT",'bus0'] = f"{bus} gas"
-    
-    # Incentivize Hydrogen: Scenario based
-    if scenario_settings.get('H2_ready') \
-        and scenario_settings.get('H2_ready_OPEX'):
-            for tech in scenario_settings.get('H2_OPEX_support').keys():
-                H2R.H2_Ready_opex(n,
-                                  total_support=\
-                                      scenario_settings\
-                                          .get('H2_OPEX_support')[tech],
-                                          element=tech)
-
-    # Solve network for 2020 
-    n.config = config
-    n.opts = opts
-    config["year"] = 2020
-
-    n.lopf(solver_name=solver_options['name'],
-           solver_options=solver_options,
-           extra_functionality=extra_functionality,
-           solver_dir=tmpdir)
-
-    df = mp.append_gens(n, year=2020, df=df)
-    mp.initial_storage(n)
+        ch.solve_year(n, config, profile)
+        # Years restored from the solution cache instead of solved
+        cached_years = [2020] if n.solution_cached else []
 
-    # Prepare to track potential changes in subsequent years
-    years_cols = list(range(2021, 2051))
-    Potentials_over_years = pd.DataFrame({"2020": saved_potential})
-    Potentials_over_years = Potentials_over_years.reindex(columns=Potentials_over_years.columns.tolist() + years_cols)
+        mp.append_gens(n, year=2020, ledger=ledger)
+        mp.initial_storage(n)
 
+        # Prepare to track potential changes in subsequent years
+        years_cols = list(range(2021, end_year + 1))
+        Potentials_over_years = pd.DataFrame({"2020": saved_potential})
+        Potentials_over_years = Potentials_over_years.reindex(columns=Potentials_over_years.columns.tolist() + years_cols)
+
+        if config.get('checkpoint', False):
+            ck.save_checkpoint(checkpoint_dir, 2020, n, loop_state())
+
+    else:
+        # Restore the network and the loop state of the last finished year
+        # (same order as loop_state)
+        n, state = ck.load_checkpoint(checkpoint_dir, resume_from - 1)
+        (last_year, ledger, costs, demand, saved_potential, Potentials_over_years,
+         gen_bar, inst_bar, store_bar, ren_perc,
+         removal_data, conventional_base, renewables, phase_out) = \
+            (state[key] for key in ck.STATE_KEYS)
+        if end_year > last_year:
+            raise ValueError(f"The checkpoint covers the years up to {last_year}, "
+                             f"cannot resume up to {end_year}")
+        # The result tables follow the end_year of this run
+        gen_bar = gen_bar.reindex(range(2020, end_year + 1))
+        inst_bar = inst_bar.reindex(range(2020, end_year + 1))
+        store_bar = store_bar.reindex(range(2020, end_year + 1))
+        Potentials_over_years = Potentials_over_years.reindex(
+            columns=["2020"] + list(range(2021, end_year + 1)))
+        n.config = config
+        n.opts = opts
+        cached_years = []
 
+    # Figures are drawn in the loop ('inline'), by a background process
+    # from the stored networks ('background'), after the run ('deferred')
+    # or not at all ('off')
+    plot_mode = config['plotting'].get('mode', 'inline')
+    if plot_mode == 'background':
+        renderer, renders = pt.start_renderer(), {}
 
-    # The iterative optimization for 2021 to 2031, e.g. (adapt as needed):
-    for i in range(2021, 2051):
+    # The iterative optimization from start to end_year:
+    for i in range(start, end_year + 1):
 
         # Update lines, gens, stor
-        df_H2 = mp.update_const_lines(n, i, df_H2)
-        mp.update_const_gens(n)
-        mp.update_const_storage(n)
-        df_stor, df_H2_store = mp.append_storages(n, i, df_stor, df_H2_store)
+        with pf.stage(profile, 'update_const_lines', i):
+            mp.update_const_lines(n, i, ledger)
+        with pf.stage(profile, 'update_const_gens', i):
+            mp.update_const_gens(n)
+        with pf.stage(profile, 'update_const_storage', i):
+            mp.update_const_storage(n)
+        with pf.stage(profile, 'append_storages', i):
+            mp.append_storages(n, i, ledger)
 
         # Some plotting or tracking
-        pt.installed_capacities(n, year=i-1, clusters=clusters,colors=colors)
-        pt.Country_Map(n, year=i-1, config=config, clusters=clusters)
-        ren_perc.append(pt.pie_chart(n, i-1,clusters=clusters,colors=colors))
+        with pf.stage(profile, 'plotting', i):
+            if plot_mode == 'inline':
+                ren_perc.append(pt.plot_year(n, i-1, bus_folder, config))
+            else:
+                ren_perc.append(pt.renewable_share(n))
 
         # Track renewable percentage
-        gen_bar = pt.Gen_Bar(n, gen_bar, i-1)
-        inst_bar = pt.Inst_Bar(n, inst_bar, i-1)
-        store_bar = pt.storage_installation(n, store_bar, i-1)
-
-        n.export_to_netcdf(f"Results/{str(clusters)}/{i-1}.nc")
+        with pf.stage(profile, 'bar_tables', i):
+            gen_bar = pt.Gen_Bar(n, gen_bar, i-1)
+            inst_bar = pt.Inst_Bar(n, inst_bar, i-1)
+            store_bar = pt.storage_installation(n, store_bar, i-1)
+
+        with pf.stage(profile, 'export_to_netcdf', i):
+            n.export_to_netcdf(f"{bus_folder}/{i-1}.nc")
+        if plot_mode == 'background':
+            renders[i-1] = renderer.submit(pt.render_year, f"{bus_folder}/{i-1}.nc",
+                                           i-1, bus_folder, config)
         # Remove or reduce capacity for coal & lignite
-        mp.remove_Phase_out(n, phase_out_removal, yearly_phase_out)
-        mp.remove_Phase_out(n, phase_out_removal_lignite, yearly_phase_out_lignite)
-
-        # If year == 2038, set all coal/lignite p_nom to zero
-        if i == 2038:
-            n.generators.loc[n.generators.carrier=='coal','p_nom'] = 0
-            n.generators.loc[n.generators.carrier=='lignite','p_nom'] = 0
+        with pf.stage(profile, 'remove_Phase_out', i):
+            mp.apply_phase_out(n, phase_out, i)
         #H2 only in CCGT from 2040 on
-        if scenario_settings.get('H2_ready') and i >= 2041:
-            H2R.H2_Mixing(n,i,
-                          scenario_settings.get('H2_ready'),
-                          removal_data)
-        if scenario_settings.get('H2_ready') \
-            and scenario_settings.get('H2_ready_CAPEX'):#implement only if both are allowed 
-                CCGT_support=0 if i not in \
-                        list(scenario_settings.get("H2_CAPEX_support"))\
-                            else scenario_settings.get("H2_CAPEX_support")[i]
-                H2R.H2_Ready_plus(n,CCGT_support)
+        with pf.stage(profile, 'H2_ready', i):
+            if scenario_settings.get('H2_ready') and i >= 2041:
+                H2R.H2_Mixing(n,i,
+                              scenario_settings.get('H2_ready'),
+                              removal_data)
+            if scenario_settings.get('H2_ready') \
+                and scenario_settings.get('H2_ready_CAPEX'):#implement only if both are allowed 
+                    CCGT_support=0 if i not in \
+                            list(scenario_settings.get("H2_CAPEX_support"))\
+                                else scenario_settings.get("H2_CAPEX_support")[i]
+                    H2R.H2_Ready_plus(n,CCGT_support)
 
 
         # Update costs, load, remove capacity
-        mp.update_cost(n, i, cost_factors, fuel_cost=fuel_cost)
-        mp.update_load(n, 1.01)
-
-        mp.delete_gens(n, i, df,saved_potential,regional_potential)
-        mp.delete_original_RES(n, i, renewables, saved_potential, regional_potential)
-        mp.delete_storage(n, i, df_stor, df_H2, df_H2_store)
-        mp.delete_old_gens(n, i, conventional_base)
+        with pf.stage(profile, 'update_cost', i):
+            cs.set_costs(n, costs, i)
+        with pf.stage(profile, 'update_load', i):
+            mp.set_demand(n, demand, i)
+
+        with pf.stage(profile, 'delete_gens', i):
+            mp.delete_gens(n, i, ledger, saved_potential, regional_potential)
+        with pf.stage(profile, 'delete_original_RES', i):
+            mp.delete_original_RES(n, i, renewables, saved_potential, regional_potential)
+        with pf.stage(profile, 'delete_storage', i):
+            mp.delete_storage(n, i, ledger)
+        with pf.stage(profile, 'delete_old_gens', i):
+            mp.delete_old_gens(n, i, conventional_base)
 
         n.lines.s_max_pu = 1.0
-        mp.update_co2limit(n, int(co2lims.co2limit[co2lims.year==i]))
-        mp.update_co2price(n, year=i, co2price=co2price)
+        with pf.stage(profile, 'update_co2', i):
+            mp.update_co2limit(n, int(co2lims.co2limit[co2lims.year==i]))
 
         config["year"] = i
         n.config = config
-        n.lopf(solver_name=solver_options['name'],
-               solver_options=solver_options,
-               extra_functionality=extra_functionality,
-               solver_dir=tmpdir)
+        ch.solve_year(n, config, profile)
+        if n.solution_cached:
+            cached_years.append(i)
         
-        mp.initial_storage(n)
-        saved_potential = mp.Yearly_potential(n, saved_potential, 
-                                              regional_potential,
-                                              agg_p_nom_minmax)
-        Potentials_over_years.loc[:, i] = saved_potential
-
-        df = mp.append_gens(n, i, df)
+        with pf.stage(profile, 'initial_storage', i):
+            mp.initial_storage(n)
+        with pf.stage(profile, 'Yearly_potential', i):
+            saved_potential = mp.Yearly_potential(n, saved_potential, 
+                                                  regional_potential,
+                                                  agg_p_nom_minmax)
+            Potentials_over_years.loc[:, i] = saved_potential
+
+        with pf.stage(profile, 'append_gens', i):
+            mp.append_gens(n, i, ledger)
+
+        if config.get('checkpoint', False):
+            with pf.stage(profile, 'checkpoint', i):
+                ck.save_checkpoint(checkpoint_dir, i, n, loop_state())
+        if profile is not None:
+            pf.save_profile(profile, bus_folder)
 
     # 10) Final updates after the myopic optimization
-    mp.update_const_lines(n, i, df_H2)
+    mp.update_const_lines(n, i, ledger)
     mp.update_const_gens(n)
     mp.update_const_storage(n)
-    df_stor, df_H2_store = mp.append_storages(n, i, df_stor, df_H2_store)
+    mp.append_storages(n, i, ledger)
 
-    pt.installed_capacities(n, year=i,clusters=clusters, colors=colors)
-    ren_perc.append(pt.pie_chart(n, i,clusters=clusters,colors=colors))
-    pt.Country_Map(n, year=i, config=config, clusters=clusters)
+    with pf.stage(profile, 'final_plotting'):
+        if plot_mode == 'inline':
+            ren_perc.append(pt.plot_year(n, i, bus_folder, config))
+        else:
+            ren_perc.append(pt.renewable_share(n))
 
     gen_bar = pt.Gen_Bar(n, gen_bar, i)
     inst_bar = pt.Inst_Bar(n, inst_bar, i)
@@ -344,12 +417,79 @@ def main():
     pt.Bar_to_PNG(inst_bar, bus_folder, "Installation",colors=colors)
     pt.Storage_Bar(store_bar, bus_folder,colors=colors)
 
-    n.export_to_netcdf(f"{bus_folder}/{i}.nc")
-    df.to_excel(f"{bus_folder}/addition.xlsx", index=True)
+    with pf.stage(profile, 'final_export_to_netcdf'):
+        n.export_to_netcdf(f"{bus_folder}/{i}.nc")
+    addition = vt.export_additions(ledger, f"{bus_folder}/addition.xlsx")
+
+    with pf.stage(profile, 'final_plotting_wait'):
+        if plot_mode == 'background':
+            renders[i] = renderer.submit(pt.render_year, f"{bus_folder}/{i}.nc",
+                                         i, bus_folder, config)
+            pt.stop_renderer(renderer, renders)
+        elif plot_mode == 'deferred':
+            pt.render_results(bus_folder, config, years=range(2020, i + 1))
 
     Potentials_over_years.to_excel(f"{bus_folder}/Potentials_over_years.xlsx", index=True)
 
+    if profile is not None:
+        pf.save_profile(profile, bus_folder)
+        print(f"Run profile (details in {bus_folder}/profile.csv):")
+        print(pf.summary(profile).round(3).to_string())
+
+    n_years = end_year - start + 1 + (resume_from is None)
+    if len(cached_years) == n_years:
+        logger.warning("All years of the run were restored from the solution cache, "
+                       "none was solved (set cache.years: false to solve them)")
+    elif cached_years:
+        logger.info(f"{len(cached_years)} of {n_years} years restored from the solution "
+                    f"cache: {', '.join(map(str, cached_years))}")
+
     logger.info("Model run completed successfully.")
-          
+
+    return {'directory': bus_folder, 'gen_bar': gen_bar, 'inst_bar': inst_bar,
+            'store_bar': store_bar, 'ren_perc': ren_perc, 'addition': addition,
+            'Potentials_over_years': Potentials_over_years}
+
+
+def parse_overrides(items):
+    """
+    Parses KEY=VALUE command line overrides; values are read as YAML.
+
+    Parameters:
+    -----------
+    items : list of str
+        Overrides such as 'scenario_settings.H2_import=false'.
+
+    Returns:
+    --------
+    dict
+        The overrides keyed by their dotted names.
+    """
+    overrides = {}
+    for item in items:
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Override '{item}' is not of the form KEY=VALUE")
+        overrides[key.strip()] = yaml.safe_load(value)
+    return overrides
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the MyPyPSA-Ger myopic optimization.")
+    parser.add_argument("--config", default="config.yaml",
+                        help="configuration file (default: config.yaml)")
+    parser.add_argument("--clusters", type=int,
+                        help="number of clusters (default: scenario_settings.clusters)")
+    parser.add_argument("--end-year", type=int, default=2050, metavar="YEAR",
+                        help="last year of the myopic optimization (default: 2050)")
+    parser.add_argument("--output-dir",
+                        help="results folder (default: Results/<clusters>)")
+    parser.add_argument("--set", dest="overrides", action="append", default=[],
+                        metavar="KEY=VALUE",
+                        help="override a config value, e.g. scenario_settings.H2_import=false")
+    parser.add_argument("--resume-from", type=int, metavar="YEAR",
+                        help="resume from the checkpoint of the year before YEAR")
+    args = parser.parse_args()
+    main(config_path=args.config, clusters=args.clusters, end_year=args.end_year,
+         output_dir=args.output_dir, overrides=parse_overrides(args.overrides),
+         resume_from=args.resume_from)
@@ -6,14 +6,26 @@ This module contains extra constraints passed to 'pypsa.linopf.lopf'
 The functions here are adapted from the original scripts of PyPSA-Eur 
 to fit the purpose of myopic constraints on generators and links in the
 case of MyPyPSA-Ger
+
+The '_linopy' variants add the same constraints to the linopy model in
+'n.model', which is used by the 'optimize' backend and the persistent model
+in Model_Code/solving.py
 """
+import os
 import logging
 logger = logging.getLogger(__name__)
 import numpy as np
 import pandas as pd
+from xarray import DataArray
+import Model_Code.roles as rl
+
+try:
+    from pypsa.linopf import get_var, define_constraints, linexpr
+except ImportError:  # PyPSA without the legacy LOPF, only the linopy variants can be used
+    get_var = define_constraints = linexpr = None
 
-from pypsa.linopf import (get_var, define_constraints,
-                          linexpr, join_exprs)
+# Aggregate capacity limits by (file, modification time), parsed once per run
+_CCL_LIMITS = {}
 
 
 
@@ -41,122 +53,174 @@ def add_battery_constraints(n):
                    link_p_nom[nodes + " discharger"].values))
     define_constraints(n, lhs, "=", 0, 'Link', 'charger_ratio')
 
+def _hydrogen_triplets(n):
+    """Returns the H2 store, fuel cell and electrolysis of every AC bus that has all three."""
+    buses = n.buses.index[n.buses.carrier=='AC']
+    return (rl.get_roles(n)['buses'].loc[buses, ['H2 store', 'fuel cell', 'electrolysis']]
+            .dropna())
+
 def add_hydrogen_constraints(n):
-    store_name=n.stores[n.stores.carrier=='H2'].index
-    link_1_name= [elem for elem in n.links.index if 'fuel cell' in elem]
-    link_2_name= [elem for elem in n.links.index if 'electrolysis' in elem]
+    table = _hydrogen_triplets(n)
+    if table.empty:
+        return
     ratio2 = 168
     ratio1 = ratio2 * 0.58
-    
-    
-    for bus in n.buses.index[n.buses.carrier=='AC']:
-        fc= [elem for elem in link_1_name if bus in elem]
-        st= [elem for elem in store_name if bus in elem]
-        el= [elem for elem in link_2_name if bus in elem]
-
-        d=get_var(n, "Store", "e_nom").loc[st[0]]
-        s=get_var(n, "Link", "p_nom").loc[fc[0]]
-        r=get_var(n, "Link", "p_nom").loc[el[0]]
-    
-        lhs= linexpr((1, d),(-ratio1,s))
-        define_constraints(n, lhs, "==", 0, f'{bus}-FC')
 
-        lhs= linexpr((1, d),(-ratio2,r))
-        define_constraints(n, lhs, "==", 0, f'{bus}-EL')
+    e_nom = get_var(n, "Store", "e_nom")
+    p_nom = get_var(n, "Link", "p_nom")
+    d = pd.Series(e_nom.loc[table['H2 store']].values, index=table.index)
+    s = pd.Series(p_nom.loc[table['fuel cell']].values, index=table.index)
+    r = pd.Series(p_nom.loc[table['electrolysis']].values, index=table.index)
 
-def add_CCL_constraints(n, config):
-    agg_p_nom_limits = config['scenario_settings'].get('agg_p_nom_limits')
+    lhs = linexpr((1, d), (-ratio1, s))
+    define_constraints(n, lhs, "==", 0, 'H2', 'FC')
+
+    lhs = linexpr((1, d), (-ratio2, r))
+    define_constraints(n, lhs, "==", 0, 'H2', 'EL')
+
+def _ccl_limits(path):
+    """Returns the maximum aggregate capacity per carrier of the limits file, read once per file."""
     try:
-        agg_p_nom_minmax = pd.read_csv(agg_p_nom_limits,
-                                       index_col=0)
-            
-    except IOError:
+        key = (path, os.path.getmtime(path))
+    except (OSError, TypeError):
         logger.exception("Need to specify the path to a .csv file containing "
                           "aggregate capacity limits per country in "
-                          "config['electricity']['agg_p_nom_limit'].")
-    # cc means country and carrier
-    year=config['year']
+                          "config['scenario_settings']['agg_p_nom_limits'].")
+        raise
+    if key not in _CCL_LIMITS:
+        agg_p_nom_minmax = pd.read_csv(path, index_col=0)
+        _CCL_LIMITS[key] = agg_p_nom_minmax[['carrier','max']].dropna().set_index('carrier')['max']
+    return _CCL_LIMITS[key].copy()
+
+def _ccl_link_carriers(n):
+    """Returns the carrier of the links for the CCL: the last word of the name
+    (e.g. 'CCGT', 'electrolysis', 'cell'), except for DC and import links."""
+    keep = n.links.carrier.isin(['DC', 'imports'])
+    return n.links.carrier.where(keep, n.links.index.str.split().str[-1])
+
+def _ccl_plan(n, config):
+    """ Groups the extendable components by the carriers with a CCL. If stores
+    are extendable, the carriers of the links are set to their CCL carrier.
+
+    Returns:
+    --------
+    dict
+        For every component the carrier of its limited extendable components.
+    pd.Series
+        The maximum capacity of the limited carriers, including the existing
+        capacity of the links.
+    """
+    maximum = _ccl_limits(config['scenario_settings'].get('agg_p_nom_limits'))
+
+    # Generators (H2 imports are not limited)
+    carriers = {'Generator': n.generators.carrier[n.generators.carrier != 'H2']}
 
-    minimum = agg_p_nom_minmax[['carrier','min']].dropna()
-    minimum.set_index('carrier',inplace=True)
-    
-    maximum = agg_p_nom_minmax[['carrier','max']].dropna()
-    maximum.set_index('carrier',inplace=True)
-
-    # Generators
-    p_nom_per_cc_g = (pd.DataFrame(
-                    {'p_nom': linexpr((1, get_var(n, 'Generator', 'p_nom'))),
-                    'carrier': n.generators.carrier})
-                    .dropna(subset=['p_nom'])
-                    .groupby('carrier').p_nom
-                    .apply(join_exprs))
-    try:
-        p_nom_per_cc_g.drop('H2',inplace=True)
-    except:
-        pass
     # Storage_Unit
-    # cc means country and carrier
-    if any(n.storage_units.p_nom_extendable == True):
-        p_nom_per_cc_s = (pd.DataFrame(
-                        {'p_nom': linexpr((1, get_var(n, 'StorageUnit', 'p_nom'))),
-                        'carrier': n.storage_units.carrier})
-                        .dropna(subset=['p_nom'])
-                        .groupby(['carrier']).p_nom
-                        .apply(join_exprs))
-
-    else:
-        temp=pd.DataFrame(columns=['p_nom'])
-        p_nom_per_cc_s=temp.p_nom
-    
-    #Store: H2 
-    if any(n.stores.e_nom_extendable == True):
-                
-        for link in n.links.index:
-            if n.links.loc[link,'carrier'] not in ['DC', 'imports']:
-                n.links.loc[link,'carrier'] = link.split()[-1]
-        for carrier in n.links.carrier.unique():
-            p_act=n.links.loc[n.links.carrier==carrier,'p_nom'].sum()
-            try:
-                # minimum.loc[carrier]+=p_act
-                maximum.loc[carrier]+=p_act
-            except:
-                pass
-
-        
-        p_nom_per_cc_h=pd.DataFrame(
-            {'p_nom': linexpr((1, get_var(n, 'Link', 'p_nom'))),
-             'carrier': n.links.carrier,
-             'name': n.links.index}
-            ).dropna(subset=['p_nom']
-                     ).groupby(['carrier']).p_nom.apply(join_exprs)
-        
-    else:
-        temp=pd.DataFrame(columns=['p_nom'])
-        p_nom_per_cc_h=temp.p_nom
-
-
-
-    p_nom_per_cc = pd.concat([p_nom_per_cc_g,
-                              p_nom_per_cc_s,
-                              p_nom_per_cc_h], ignore_index=False)
-    # Run in case of minimum expansion limit
-    # if not minimum.empty:
-    #     idxs=np.intersect1d (np.array(p_nom_per_cc.index),
-    #                     np.array(minimum.index))
-    #     # minimum.loc[idxs].to_excel('data/minimum_cc.xlsx')
-    #     for tech in idxs:
-    #         print(f'Applying Min CCL to {tech}')
-    #     # p_nom_per_cc.loc[idxs].to_excel('data/p_nom_per_cc_min.xlsx')
-
-    #     minconstraint = define_constraints(n, p_nom_per_cc.loc[idxs].values,
-    #                                        '>=', minimum.loc[idxs].values, 'agg_p_nom', 'min')
-
-    # year=config['year']
-    if not maximum.empty:
-        idxs=np.intersect1d (np.array(p_nom_per_cc.index),
-                        np.array(maximum.index))
-        print(f'{year}: Applying Max CCL to',", ".join([str(i) for i in idxs]))
-        maxconstraint = define_constraints(n, p_nom_per_cc.loc[idxs].values,
-                                           '<=', maximum.loc[idxs].values, 'agg_p_nom', 'max')
+    if n.storage_units.p_nom_extendable.any():
+        carriers['StorageUnit'] = n.storage_units.carrier
+
+    #Store: H2
+    if n.stores.e_nom_extendable.any():
+        # the links keep the CCL carrier, other code selects them by it (e.g. H2_Mixing)
+        n.links['carrier'] = _ccl_link_carriers(n)
+        p_act = n.links.p_nom.groupby(n.links.carrier).sum()
+        maximum += p_act.reindex(maximum.index).fillna(0).values
+        carriers['Link'] = n.links.carrier
+
+    groups = {}
+    for c, carrier in carriers.items():
+        carrier = carrier.reindex(n.get_extendable_i(c)).dropna()
+        carrier = carrier[carrier.isin(maximum.index)]
+        if not carrier.empty:
+            groups[c] = carrier
+    idxs = pd.Index(sorted(set().union(*groups.values())) if groups else [], name='carrier')
+    return groups, maximum[~maximum.index.duplicated()].reindex(idxs)
 
+def add_CCL_constraints(n, config):
+    year=config['year']
+    groups, maximum = _ccl_plan(n, config)
+    if maximum.empty:
+        return
+    print(f'{year}: Applying Max CCL to',", ".join([str(i) for i in maximum.index]))
+
+    # sum the capacity variables per carrier: terms sorted by carrier and joined per block
+    terms = np.concatenate([linexpr((1, get_var(n, c, 'p_nom').loc[carrier.index])).values
+                            for c, carrier in groups.items()])
+    keys = np.concatenate([carrier.values for carrier in groups.values()]).astype(str)
+    order = np.argsort(keys, kind='stable')
+    idxs, starts = np.unique(keys[order], return_index=True)
+    lhs = np.add.reduceat(terms[order].astype(object), starts)
+    # the limits are a column, as in the original PyPSA-Eur formulation
+    define_constraints(n, lhs, '<=', maximum.loc[idxs].to_frame().values, 'agg_p_nom', 'max')
 
+
+def extra_functionality_linopy(n, snapshots):
+    """
+    Supplementary constraints added to the linopy model ``n.model``.
+    Same constraints as ``extra_functionality`` for the legacy LOPF.
+
+    """
+    opts = n.opts
+    config = n.config
+    if 'CCL' in opts and n.generators.p_nom_extendable.any():
+        add_CCL_constraints_linopy(n, config)
+    add_battery_constraints_linopy(n)
+    add_hydrogen_constraints_linopy(n)
+
+def _by_bus(var, names, buses):
+    """Selects the variables 'names' and relabels them by their AC bus."""
+    var = var.loc[list(names)]
+    return var.rename({var.dims[0]: 'Bus'}).assign_coords(Bus=buses.values)
+
+def add_battery_constraints_linopy(n):
+
+    nodes = n.buses.index[n.buses.carrier == "battery"]
+    if nodes.empty or 'Link-p_nom' not in n.model.variables:
+        return
+    link_p_nom = n.model["Link-p_nom"]
+    eff = n.links.loc[nodes + " discharger", "efficiency"].values
+    lhs = (_by_bus(link_p_nom, nodes + " charger", nodes)
+           - eff * _by_bus(link_p_nom, nodes + " discharger", nodes))
+    n.model.add_constraints(lhs == 0, name='Link-charger_ratio')
+
+def add_hydrogen_constraints_linopy(n):
+    table = _hydrogen_triplets(n)
+    if table.empty:
+        return
+    ratio2 = 168
+    ratio1 = ratio2 * 0.58
+
+    d = _by_bus(n.model["Store-e_nom"], table['H2 store'], table.index)
+    s = _by_bus(n.model["Link-p_nom"], table['fuel cell'], table.index)
+    r = _by_bus(n.model["Link-p_nom"], table['electrolysis'], table.index)
+
+    n.model.add_constraints(d - ratio1 * s == 0, name='H2-FC')
+    n.model.add_constraints(d - ratio2 * r == 0, name='H2-EL')
+
+def _p_nom_per_carrier(n, c, attr, carrier, idxs):
+    """Sums the extendable capacity variables of component c per carrier in idxs."""
+    from linopy import LinearExpression
+
+    var = n.model[f"{c}-{attr}"]
+    dim = f"{c}-ext"
+    carrier = carrier.reindex(var.indexes[dim])
+    carrier = carrier[carrier.isin(idxs)]
+    grouper = DataArray(carrier.rename_axis(dim).rename('carrier'))
+    return (var.loc[list(carrier.index)].groupby(grouper).sum()
+            .reindex(carrier=idxs, fill_value=LinearExpression.fill_value))
+
+def add_CCL_constraints_linopy(n, config):
+    import linopy
+
+    year=config['year']
+    groups, maximum = _ccl_plan(n, config)
+    if maximum.empty:
+        return
+    print(f'{year}: Applying Max CCL to',", ".join([str(i) for i in maximum.index]))
+    idxs = maximum.index
+    lhs = linopy.merge([_p_nom_per_carrier(n, c, 'p_nom', carrier, idxs)
+                        for c, carrier in groups.items()])
+    # every carrier sum is bounded by every limit, as the column of limits of
+    # the legacy builder (add_CCL_constraints)
+    rhs = DataArray(maximum.rename_axis('limit'))
+    n.model.add_constraints(lhs <= rhs, name='agg_p_nom-max')
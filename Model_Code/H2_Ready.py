@@ -4,6 +4,7 @@
 This module provides functions for H2-Ready power plants
 """
 import numpy as np
+import Model_Code.roles as rl
 
 def H2_Mixing(n,i,H2_Ready,removal_data):
     
@@ -40,9 +41,7 @@ def H2_Ready_opex(n,total_support,element):
     eff=0.8 if element =='electrolysis' else 0.61
     ts=total_support/0.030003*eff
     # X Eur/kg H2 local production or in CCGT subsidy subsidy
-    n.links.loc[[elem for elem in \
-                 n.links.index if element in elem],'marginal_cost']=\
-        ts
+    n.links.loc[rl.role_names(n, rl.matching_roles(element)),'marginal_cost']=ts
 
 
 def H2_Ready_plus(n, total_support):
@@ -51,12 +50,14 @@ def H2_Ready_plus(n, total_support):
     nb = len(n.buses.index[n.buses.carrier == 'AC'])
     ts = (total_support*1e3)/nb #MW to GW
     
-    for link in n.links.index[n.links.carrier == 'CCGT']:
-        n.links.loc[link, 'p_nom'] += ts/n.links.loc[link, 'efficiency']
-        n.links.loc[link, 'p_nom_extendable'] = False
-        c1 = n.links.bus1 == n.links.loc[link, 'bus0']
-        c2 = n.links.bus0 == 'DE0 ' + link.split()[1] + ' H2'
+    ccgt = n.links.loc[n.links.carrier == 'CCGT']
+    support = ts/ccgt.efficiency.values
+    n.links.loc[ccgt.index, 'p_nom'] += support
+    n.links.loc[ccgt.index, 'p_nom_extendable'] = False
 
-        n.links.loc[(c1) & (c2), 'p_nom_extendable'] = False
-
-        n.links.loc[(c1) & (c2), 'p_nom'] += ts/n.links.loc[link, 'efficiency']
+    # H2 input of the same bus, feeding the gas bus of the CCGT
+    h2_input = rl.role_at(n, 'H2_input', ccgt.bus1).values
+    feeds = np.array([isinstance(link, str) and n.links.at[link, 'bus1'] == bus0
+                      for link, bus0 in zip(h2_input, ccgt.bus0)], dtype=bool)
+    n.links.loc[h2_input[feeds], 'p_nom_extendable'] = False
+    n.links.loc[h2_input[feeds], 'p_nom'] += support[feeds]
@@ -11,6 +11,10 @@ time-evolving power system model.
 import pandas as pd
 import numpy as np
 import logging
+import Model_Code.vintage as vt
+import Model_Code.roles as rl
+
+logger = logging.getLogger(__name__)
 
 
 def update_load(n,factor):
@@ -31,75 +35,77 @@ def update_load(n,factor):
     # Multiply by factor
     n.loads_t.p_set[Germany_cols]*=factor
 
-def update_cost(n,year,cost_factors,fuel_cost):
-    """
-    Updates capital and fuel costs for technologies in the network for a specified year.
+def demand_trajectory(n, setting, years, base_year=2020):
+    """ Computes the load multipliers of every year relative to the base year.
+
+    Only the German loads (names starting with 'DE') are scaled.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object with the load profiles of the base year.
+    setting : float, dict or str
+        The 'demand_growth' of the scenario settings: a constant yearly growth
+        rate (e.g. 0.01), a dict of years to the demand relative to the base
+        year, or the path of a CSV file with the demand relative to the base
+        year by year (rows) and load (columns). Values between the given years
+        are linearly interpolated and kept constant after the last year; loads
+        missing from the CSV file keep the demand of the base year.
+    years : list-like of int
+        The years following the base year.
+    base_year : int, optional
+        The year of the load profiles in the network. Default is 2020.
 
-    Adjusts the capital costs of links, stores, generators, and storage units based on cost factors.
-    Updates the marginal costs of generators by accounting for changes in fuel costs, considering 
-    different fuels and generator efficiency.
+    Returns:
+    --------
+    dict
+        'p_set': the load profiles of the base year (pd.DataFrame), and
+        'factors': the multipliers (pd.DataFrame indexed by year, base year
+        included, with a column per load).
+    """
+    loads=[col for col in n.loads_t.p_set.columns if col.startswith('DE')]
+    index=pd.Index([base_year] + list(years), name='year')
+
+    if isinstance(setting, (int, float)):
+        factors=pd.DataFrame(np.repeat(((1 + setting) ** (index - base_year)).values[:, None],
+                                       len(loads), axis=1), index=index, columns=loads)
+    else:
+        if isinstance(setting, dict):
+            table=pd.DataFrame({col: pd.Series(setting, dtype=float) for col in loads})
+        else:
+            table=pd.read_csv(setting, index_col=0)
+            table.index=table.index.astype(int)
+            missing=[col for col in loads if col not in table.columns]
+            if missing:
+                logger.warning(f"No demand trajectory for {', '.join(missing)} in {setting}, "
+                               f"keeping the demand of {base_year}")
+            table=table.reindex(columns=loads)
+        if base_year not in table.index:
+            table.loc[base_year]=1.0
+        table=table.sort_index()
+        full=table.reindex(table.index.union(index)).interpolate(method='index', limit_area='inside')
+        factors=full.ffill().fillna(1.0).loc[index]
+
+    return {'p_set': n.loads_t.p_set[loads].copy(), 'factors': factors}
+
+def set_demand(n, demand, year):
+    """ Sets the load profiles of a year: the base year profiles times the multipliers of the year.
 
     Parameters:
     -----------
     n : Network
         The network object to update.
+    demand : dict
+        The demand trajectory, see demand_trajectory.
     year : int
-        The year for which costs are being updated.
-    cost_factors : pd.DataFrame
-        DataFrame containing cost adjustment factors for different technologies by year.
-    fuel_cost : pd.DataFrame
-        DataFrame with fuel costs for different technologies by year.
+        The year to set.
 
     Returns:
     --------
     None
     """
-    
-    #CAPEX
-    
-    for tech in cost_factors.columns:
-        c=cost_factors[tech].loc[year]
-        indices=[elem for elem in n.links.index if tech in elem]
-        n.links.loc[indices,'capital_cost']*=c
-        n.stores.loc[n.stores.carrier==tech,'capital_cost']*= c
-
-        n.generators.loc[n.generators.carrier==tech,'capital_cost']*= c
-        # n.generators.loc[n.generators.carrier==tech,'marginal_cost']*= c
-        n.storage_units.loc[n.storage_units.carrier==tech,'capital_cost']*= c
-        # n.storage_units.loc[n.storage_units.carrier==tech,'marginal_cost']*= c
-        
-
-
-#    n.generators.marginal_cost= n.generators.marginal_cost*0.99 ## TODO: Decrease only RES, seperate for carriers
-    # Fuel
-    # years = [int(item) for item in fuel_cost.columns]
-
-    # for z in range(len(years[:-1])):
-    #     if years[z] <= year < years[z+1]:
-    #         spec_year=years[z]
-    # if year == 2050:
-    #     spec_year=years[z]
-    
-    #Fuel Cost:
-    fuels=list(fuel_cost.columns)
-
-    for tech in fuels:
-        mask = (n.generators.carrier == tech) | (n.generators.carrier == f"imports_{tech}")
-        if tech =='gas':
-            
-            old_cost=fuel_cost.loc[year-1,tech]
-            new_cost=fuel_cost.loc[year,tech]
-            n.generators.loc[mask,'marginal_cost']+=new_cost-old_cost
-
-        elif tech=='H2':
-            new_cost=fuel_cost.loc[year,tech]
-            indices=[elem for elem in n.generators.index if tech in elem]
-            n.generators.loc[indices,'marginal_cost']=new_cost
-        else:
-            eff = n.generators.loc[mask, 'efficiency'].mean()
-            old_cost=fuel_cost.loc[year-1,tech]/eff
-            new_cost=fuel_cost.loc[year,tech]/eff
-            n.generators.loc[mask, 'marginal_cost'] += (new_cost - old_cost)
+    base=demand['p_set']
+    n.loads_t.p_set[base.columns]=base.values * demand['factors'].loc[year, base.columns].values
 
 def update_co2price(n,year,co2price):
     """Updates generator marginal costs based on CO2 price changes for a specified year.
@@ -132,6 +138,35 @@ def update_co2price(n,year,co2price):
                 n.generators.loc[n.generators.carrier==carrier,'efficiency'].mean()
             n.generators.loc[n.generators.carrier==carrier,'marginal_cost']+=val
 
+def co2price_trajectory(co2price, setting=None):
+    """ Applies the scenario CO2 price to the CO2 price table.
+
+    Parameters:
+    -----------
+    co2price : pd.DataFrame
+        DataFrame containing CO2 prices by year (data/co2_price.csv).
+    setting : float or dict, optional
+        The 'co2_price' of the scenario settings: either a constant price
+        from 2020 on, or prices for given years, which are linearly
+        interpolated in between and kept constant after the last year.
+        Years before the first given year keep the prices of the table.
+        If None, the table is returned unchanged.
+
+    Returns:
+    --------
+    pd.DataFrame
+        The CO2 prices by year.
+    """
+    if setting is None:
+        return co2price
+    if not isinstance(setting, dict):
+        setting = {2020: setting}
+    points = pd.Series(setting, dtype=float).sort_index()
+    co2price = co2price.astype(float)
+    years = co2price.index[co2price.index >= points.index[0]]
+    co2price.loc[years, co2price.columns[0]] = np.interp(years, points.index, points.values)
+    return co2price
+
 def update_co2limit(n, new_lim):
     """ Updates the CO2 emission limit for the network.
 
@@ -169,98 +204,101 @@ def delete_old_gens(n,year,base):
     None
     """
     
-    wanted=base[{'bus','p_nom'}][base.year_removed==year].sum(axis=1)
-    for i in range(len(wanted.index)):
-        if wanted.index[i] in n.generators.index:
-            if wanted.index[i].split()[-1] =='import':
-                continue
-            if wanted.index[i].split()[-1] in ['biomass','ror']:
-                n.generators.loc[n.generators.index == wanted.index[i],'p_nom_max'] =+ wanted[i]
-                val= n.generators.loc['Fixed ' + wanted.index[i],'p_nom'] - wanted[i]
-                if val >= 0 :
-                    n.generators.loc['Fixed ' + wanted.index[i],'p_nom']= val
-                else:
-                    n.generators.loc['Fixed ' + wanted.index[i],'p_nom'] = 0
-
-            else:
-
-                val= n.generators.loc[wanted.index[i], 'p_nom'] - wanted[i]
-                if val >= 0 :               
-                    n.generators.loc[wanted.index[i], 'p_nom']= val
-                else:
-                    n.generators.loc[wanted.index[i], 'p_nom'] = 0
-
-    for i in range(len(wanted.index)):
-        if wanted.index[i] in n.links.index:
-            if 'CCGT' in wanted.index[i]:
-                val = wanted[i]/0.61
-                n.links.loc['DE0 ' + wanted.index[i].split()[1] + ' Gas_input','p_nom']-=val
-            eff=n.links.loc[wanted.index[i],'efficiency']
-            val=n.links.loc[wanted.index[i],'p_nom']-wanted[i]/eff
-            if val >= 0 :               
-                n.links.loc[wanted.index[i], 'p_nom']= val
-            else:
-                n.links.loc[wanted.index[i], 'p_nom'] = 0
-
-def Phase_out(n,carrier, phase_year):
-    """Calculates the phase-out schedule for a specific generator carrier.
-
-    Determines the total nominal capacity (p_nom) of generators using the specified carrier
-    and calculates the yearly reduction needed to phase out the carrier by the given phase year.
+    # Plants of the same name retiring in the same year are applied one after another
+    wanted=base.p_nom[base.year_removed==year].fillna(0)
+    carrier=wanted.index.str.split().str[-1]
+    in_gens=wanted.index.isin(n.generators.index) & (carrier!='import')
+
+    twins=wanted[in_gens & carrier.isin(['biomass','ror'])]
+    for part in _by_occurrence(twins):
+        # The capacity retired this year can be rebuilt
+        n.generators.loc[part.index,'p_nom_max']=part.values
+        fixed='Fixed ' + part.index
+        val=n.generators.loc[fixed,'p_nom'].values-part.values
+        n.generators.loc[fixed,'p_nom']=np.where(val>=0,val,0)
+
+    for part in _by_occurrence(wanted[in_gens & ~carrier.isin(['biomass','ror'])]):
+        val=n.generators.loc[part.index,'p_nom'].values-part.values
+        n.generators.loc[part.index,'p_nom']=np.where(val>=0,val,0)
+
+    for part in _by_occurrence(wanted[wanted.index.isin(n.links.index)]):
+        ccgt=part[part.index.str.contains('CCGT')]
+        gas_input=rl.role_at(n, 'Gas_input', n.links.loc[ccgt.index,'bus1']).values
+        n.links.loc[gas_input,'p_nom']-=ccgt.values/0.61
+        eff=n.links.loc[part.index,'efficiency'].values
+        val=n.links.loc[part.index,'p_nom'].values-part.values/eff
+        n.links.loc[part.index,'p_nom']=np.where(val>=0,val,0)
+
+def phase_out_schedule(n, phase_out, years, base_year=2020):
+    """Computes the phase-out schedule of the generators of the given carriers.
+
+    The capacity of every carrier is reduced linearly from the base year to its phase-out year,
+    every plant in proportion to its share of the capacity. Plants below 1 MW are removed, and
+    all plants of the carrier are removed in the phase-out year.
 
     Parameters:
     -----------
     n : Network
-        The network object containing the generators.
-    carrier : str
-        The generator carrier to phase out (e.g., 'coal', 'gas').
-    phase_year : int
-        The target year by which the carrier should be fully phased out.
+        The network object containing the generators, with the capacities of the base year.
+    phase_out : dict
+        Maps the carriers to phase out (e.g., 'coal', 'lignite') to their phase-out years.
+    years : list-like of int
+        The years of the myopic optimization.
+    base_year : int, optional
+        The year of the capacities in the network. Default is 2020.
 
     Returns:
     --------
     pd.DataFrame
-        DataFrame of relevant generators using the specified carrier.
-    float
-        The calculated yearly reduction amount in nominal capacity.
-        """
-
-    a=n.generators[n.generators.carrier==carrier]
-    Total=a.p_nom.sum()
-    Yearly = Total / (phase_year - 2020)
-    dist = []
-    for i in a.index:
-        dist.append( Yearly* a.p_nom.loc[i] / Total)
-    return a, Yearly
-
-
-def remove_Phase_out (n,removal, yearly_value):
-    """Reduces nominal capacity (p_nom) of generators during a phase-out process.
-
-    Calculates and applies the yearly capacity reduction for each generator in the removal list,
-    ensuring capacities do not fall below zero.
+        The capacity (p_nom) of every plant at every year, indexed by year, with the columns
+        (carrier, generator).
+    """
+    years = list(years)
+    schedules = {}
+    for carrier, phase_year in phase_out.items():
+        if phase_year <= base_year:
+            raise ValueError(f"Phase-out year of {carrier} must be after {base_year}, got {phase_year}")
+        plants = n.generators.p_nom[n.generators.carrier==carrier]
+        total = plants.sum()
+        yearly = total / (phase_year - base_year)
+        step = yearly * plants.values / total
+        p_nom = plants.values.astype(float)
+        rows = []
+        for year in years:
+            p_nom = p_nom - step
+            p_nom = np.where(p_nom >= 1, p_nom, 0)
+            if year >= phase_year:
+                p_nom = np.zeros(len(plants))
+            rows.append(p_nom)
+        schedules[carrier] = pd.DataFrame(np.array(rows).reshape(len(years), len(plants)),
+                                          index=pd.Index(years, name='year'), columns=plants.index)
+    if not schedules:
+        return pd.DataFrame(index=pd.Index(years, name='year'),
+                            columns=pd.MultiIndex.from_tuples([], names=['carrier', 'Generator']))
+    return pd.concat(schedules, axis=1, names=['carrier', 'Generator'])
+
+
+def apply_phase_out(n, schedule, year):
+    """Sets the capacities of the phase-out schedule for a year.
 
     Parameters:
     -----------
     n : Network
         The network object containing the generators.
-    removal : pd.DataFrame
-        DataFrame of generators to phase out, including their capacities.
-    yearly_value : float
-        The yearly reduction value applied to the generators' nominal capacities.
+    schedule : pd.DataFrame
+        The phase-out schedule, see phase_out_schedule.
+    year : int
+        The year to set.
 
     Returns:
     --------
     None
     """
-    
-    for i in removal.index:
-        remove=yearly_value* removal.p_nom.loc[i] / removal.p_nom.sum()
-        val= n.generators.loc[i, 'p_nom'] - remove
-        if val >= 1 :
-            n.generators.loc[[i], 'p_nom']= val
-        else:
-            n.generators.loc[[i], 'p_nom'] = 0
+    if year not in schedule.index:
+        return
+    plants = schedule.columns.get_level_values(1)
+    present = plants.isin(n.generators.index)
+    n.generators.loc[plants[present], 'p_nom'] = schedule.loc[year].values[present]
 
 def update_const_gens(n):
     """ Updates capacities of fixed generators and associated links in the network.
@@ -279,24 +317,23 @@ def update_const_gens(n):
     --------
     None
     """
-    for i in range(len(n.generators.index)):
-        if n.generators.index[i][:5] =='Fixed':
-            n.generators.loc[n.generators.index[i],'p_nom']+=n.generators.p_nom_opt[n.generators.index[i][6:]]
-
-            if n.generators.index[i].split()[-1] in ['ror','biomass']:
-                n.generators.loc[n.generators.index[i][6:],'p_nom_max'] -= n.generators.p_nom_opt[n.generators.index[i][6:]]
-                # n.generators.p_nom_opt[n.generators.index[i][6:]] = 0 
-            else:                        
-                n.generators.loc[n.generators.index[i],'p_nom_max']-=n.generators.p_nom_opt[n.generators.index[i][6:]]
-            if n.generators.p_nom_max[n.generators.index[i][6:]] < 0:
-                n.generators.loc[n.generators.index == n.generators.index[i][6:], 'p_nom_max']=0
-
-    for link in n.links.index[(n.links.carrier=='CCGT')
-                              |
-                              (n.links.carrier=='OCGT')]:
-        if n.links.loc[link,'p_nom_opt'] > n.links.loc[link,'p_nom']:
-            n.links.loc[link,'p_nom'] = n.links.loc[link,'p_nom_opt']
-    n.links.loc[n.links.carrier=='Gas_input','p_nom'] = n.links.loc[n.links.carrier=='CCGT','p_nom'].values
+    twins = rl.fixed_twins(n, 'Generator')
+    opt = n.generators.loc[twins.values, 'p_nom_opt'].values
+    n.generators.loc[twins.index, 'p_nom'] += opt
+
+    # ror and biomass reduce the potential of the extendable generator,
+    # all others the potential of their Fixed twin
+    own = twins.index.str.split().str[-1].isin(['ror', 'biomass'])
+    n.generators.loc[twins.values[own], 'p_nom_max'] -= opt[own]
+    n.generators.loc[twins.index[~own], 'p_nom_max'] -= opt[~own]
+    negative = n.generators.loc[twins.values, 'p_nom_max'].values < 0
+    n.generators.loc[twins.values[negative], 'p_nom_max'] = 0
+
+    links = n.links.loc[(n.links.carrier=='CCGT') | (n.links.carrier=='OCGT')]
+    grown = links.index[links.p_nom_opt > links.p_nom]
+    n.links.loc[grown, 'p_nom'] = n.links.loc[grown, 'p_nom_opt']
+    pairs = rl.get_roles(n)['buses'][['Gas_input', 'CCGT']].dropna()
+    n.links.loc[pairs.Gas_input.values, 'p_nom'] = n.links.loc[pairs.CCGT.values, 'p_nom'].values
 
 
 def update_const_storage(n):
@@ -314,17 +351,17 @@ def update_const_storage(n):
     --------
     None
     """
-    for i in range(len(n.storage_units.index)):
-        if n.storage_units.index[i][:5] =='Fixed':
-            n.storage_units.loc[n.storage_units.index[i],'p_nom']+=n.storage_units.p_nom_opt[n.storage_units.index[i][6:]]
+    twins = rl.fixed_twins(n, 'StorageUnit')
+    n.storage_units.loc[twins.index, 'p_nom'] += \
+        n.storage_units.loc[twins.values, 'p_nom_opt'].values
     return 
 
 
-def update_const_lines(n,year,df_H):
+def update_const_lines(n,year,ledger):
     """" Updates line and link capacities in the network to match their optimized values if they are higher.
 
     This function adjusts the capacities of network lines and specific hydrogen-related links (electrolysis, fuel cell, H2 input),
-    as well as DC links, recording any changes in a temporary DataFrame. The updated DataFrame, including these capacity adjustments, is returned.
+    as well as DC links, recording the added hydrogen link capacities in the vintage ledger.
 
     Parameters:
     -----------
@@ -332,13 +369,12 @@ def update_const_lines(n,year,df_H):
         The network object containing the lines and links to update.
     year : int
         The year in which the capacity updates are made.
-    df_H : pd.DataFrame
-        A DataFrame tracking previous capacity changes to be updated.
+    ledger : dict
+        The vintage ledger (see Model_Code.vintage), updated in place.
 
     Returns:
     --------
-    pd.DataFrame
-        An updated DataFrame including capacity adjustments for hydrogen-related and DC links.
+    None
     """
 
     for line in n.lines.index:
@@ -346,17 +382,11 @@ def update_const_lines(n,year,df_H):
             n.lines.loc[line,'s_nom']=n.lines.loc[line,'s_nom_opt']
             
     #H2
-    techs=['electrolysis','fuel cell','H2_input']
-    indices=[]
-    for tech in techs:
-        indices.extend([elem for elem in n.links.index if tech in elem])
-    
     temp=pd.DataFrame({'p_nom':0,
                   'year_added':year,
                   'year_removed':year+20},
-                 index=indices)
-    indices=[elem for elem in n.links.index if 'H2_input' in elem]
-    temp.loc[indices,'year_removed']+=20
+                 index=rl.role_names(n, ['electrolysis','fuel cell','H2_input']))
+    temp.loc[rl.role_names(n, 'H2_input'),'year_removed']+=20
 
     for links in temp.index:
         if n.links.loc[links,'p_nom_opt']>n.links.loc[links,'p_nom']:
@@ -367,8 +397,46 @@ def update_const_lines(n,year,df_H):
     for links in n.links.index[n.links.carrier=='DC']:
         if n.links.loc[links,'p_nom_opt']>n.links.loc[links,'p_nom']:
             n.links.loc[links,'p_nom']=n.links.loc[links,'p_nom_opt']
-    
-    return pd.concat([df_H,temp])
+
+    vt.add_frame(ledger, 'H2_link', temp)
+
+def use_potential(saved_potential, amounts):
+    """ Books capacity against the remaining potential of extendable generators.
+
+    saved_potential is the potential ledger of the model: a series holding the
+    remaining potential of every extendable generator, updated in place.
+
+    Parameters:
+    -----------
+    saved_potential : pd.Series
+        A series tracking the remaining potential for each generator.
+    amounts : pd.Series
+        The capacities to book, indexed by generator; repeated labels are summed.
+
+    Returns:
+    --------
+    None
+    """
+    amounts = amounts.groupby(level=0).sum()
+    saved_potential.loc[amounts.index] -= amounts.values
+
+
+def refund_potential(saved_potential, amounts):
+    """ Returns removed capacity to the remaining potential of extendable generators.
+
+    Parameters:
+    -----------
+    saved_potential : pd.Series
+        A series tracking the remaining potential for each generator.
+    amounts : pd.Series
+        The capacities to refund, indexed by generator; repeated labels are summed.
+
+    Returns:
+    --------
+    None
+    """
+    use_potential(saved_potential, -amounts)
+
 
 def Yearly_potential(n,saved_potential,regional_potential,agg_p_nom_minmax):
     """ Adjusts the yearly potential for generator capacities and updates the network accordingly.
@@ -391,42 +459,35 @@ def Yearly_potential(n,saved_potential,regional_potential,agg_p_nom_minmax):
     pd.Series
         Updated series of saved potentials after adjustments.
         """
-    
-    for i in n.generators.index[n.generators.p_nom_extendable==True]:
-
-        if i.split()[-1] =='import':
-            continue
-        if i.split()[-1] not in ['biomass','ror']:
-            saved_potential[i]-=n.generators.p_nom_opt[i]
-            if saved_potential[i] >= regional_potential:
-                n.generators.loc[i,'p_nom_max']=regional_potential
-            else:
-                n.generators.loc[i,'p_nom_max']=saved_potential[i]
-    for i in saved_potential.index:
-        if saved_potential[i] <= 1:
-            n.generators.loc[i,'p_nom_max']=0
-            saved_potential[i]=0
-    for i in n.generators.index[n.generators.p_nom_extendable==False]:
-        n.generators.loc[i,'p_nom_max'] = 0 if n.generators.loc[i,'p_nom_max']<0 else  n.generators.loc[i,'p_nom_max']
-
-    for i in n.links.index:
-        if n.links.loc[i,'carrier'] in ['CCGT','OCGT']:
-            condition = n.links.loc[i,'p_nom'] > n.links.loc[i,'p_nom_opt']
-            val = n.links.loc[i,'p_nom'] if condition else n.links.loc[i,'p_nom_opt']
-            eff=n.links.loc[i,'efficiency']
-            n.links.loc[i,'p_nom_max']=val+ regional_potential/eff
-    for i in n.storage_units.index[
-            n.storage_units.p_nom_extendable==True]:
-        l_b=len(n.buses[n.buses.carrier=='AC'])
-        yp=agg_p_nom_minmax.loc['battery','max']
-        n.storage_units.p_nom_max.loc[i]=regional_potential# yp/l_b*1.5 ##Rp for batteries
+    ext = n.generators.index[n.generators.p_nom_extendable==True]
+    technology = ext.str.split().str[-1]
+    ext = ext[(technology != 'import') & ~technology.isin(['biomass','ror'])]
+    use_potential(saved_potential, n.generators.loc[ext, 'p_nom_opt'])
+    remaining = saved_potential.loc[ext]
+    n.generators.loc[ext, 'p_nom_max'] = \
+        remaining.where(~(remaining >= regional_potential), regional_potential).values
+
+    exhausted = saved_potential.index[saved_potential <= 1]
+    n.generators.loc[exhausted, 'p_nom_max'] = 0
+    saved_potential.loc[exhausted] = 0
+
+    fixed = n.generators.index[n.generators.p_nom_extendable==False]
+    p_nom_max = n.generators.loc[fixed, 'p_nom_max']
+    n.generators.loc[fixed, 'p_nom_max'] = p_nom_max.where(~(p_nom_max < 0), 0)
+
+    links = n.links[(n.links.carrier=='CCGT') | (n.links.carrier=='OCGT')]
+    built = links.p_nom.where(links.p_nom > links.p_nom_opt, links.p_nom_opt)
+    n.links.loc[links.index, 'p_nom_max'] = built + regional_potential/links.efficiency
+
+    n.storage_units.loc[n.storage_units.p_nom_extendable==True,
+                        'p_nom_max'] = regional_potential # Rp for batteries
     return saved_potential
 
-def append_gens(n,year,df):
-    """ Appends new generators and links with their capacities and lifetimes to the tracking DataFrame.
+def append_gens(n,year,ledger):
+    """ Appends new generators and links with their capacities and lifetimes to the vintage ledger.
 
     This function identifies extendable generators and CCGT/OCGT links in the network, calculates their optimized capacities,
-    and determines their expected lifetimes. It then appends this information to the provided DataFrame.
+    and determines their expected lifetimes. It then appends this information to the ledger.
 
     Parameters:
     -----------
@@ -434,13 +495,12 @@ def append_gens(n,year,df):
         The network object containing the generators and links.
     year : int
         The current year, used to calculate the removal year of the components.
-    df : pd.DataFrame
-        The DataFrame to which the new generator and link information will be appended.
+    ledger : dict
+        The vintage ledger (see Model_Code.vintage), updated in place.
 
     Returns:
     --------
-    pd.DataFrame
-        The updated DataFrame with the appended generators and links.
+    None
     """
 
     idx=[]
@@ -477,16 +537,13 @@ def append_gens(n,year,df):
             opt_p.append(val*ef)
 
 
-    temp=pd.DataFrame({'bus':bus,'p_nom':opt_p,'year_added':[year]*len(opt_p),'year_removed':life})
-    temp.index=idx
-    df = pd.concat([df, temp], ignore_index=False)
-    return df
+    vt.add(ledger, 'generation', idx, bus, opt_p, year, life)
 
-def append_storages(n,year,df,df_S):
-    """ Appends new storage units and stores with their capacities and lifetimes to tracking DataFrames.
+def append_storages(n,year,ledger):
+    """ Appends new storage units and stores with their capacities and lifetimes to the vintage ledger.
 
     This function identifies extendable storage units and stores in the network, calculates their optimized capacities,
-    and determines their expected lifetimes. It appends this information to the provided DataFrames.
+    and determines their expected lifetimes. It appends this information to the ledger.
 
     Parameters:
     -----------
@@ -494,15 +551,12 @@ def append_storages(n,year,df,df_S):
         The network object containing the storage units and stores.
     year : int
         The current year, used to calculate the removal year of the components.
-    df : pd.DataFrame
-        The DataFrame to which the new storage unit information will be appended.
-    df_S : pd.DataFrame
-        The DataFrame to which the new store information will be appended.
+    ledger : dict
+        The vintage ledger (see Model_Code.vintage), updated in place.
 
     Returns:
     --------
-    tuple of pd.DataFrame
-        The updated DataFrames with appended storage units and stores.
+    None
     """
 
     idx=[]
@@ -512,19 +566,13 @@ def append_storages(n,year,df,df_S):
         idx.append(n.storage_units[n.storage_units.p_nom_extendable==True].index[i])
         bus.append(n.storage_units[n.storage_units.p_nom_extendable==True].bus[i])
         opt_p.append(n.storage_units[n.storage_units.p_nom_extendable==True].p_nom_opt[i])
-    temp=pd.DataFrame({'bus':bus,'p_nom':opt_p,'year_added':[year]*len(opt_p),'year_removed':[year+15]*len(opt_p)})
-    temp.index=idx
-    df = pd.concat([df, temp], ignore_index=False)
-    
-    d_n=pd.DataFrame({'p_nom':n.stores.loc[
-        n.stores.e_nom_opt>n.stores.e_nom,'e_nom_opt'],
-        'year_added':year,
-        'year_removed':year+20})
-    df_S=pd.concat([df_S,d_n])
-    
-    for s in n.stores[n.stores.e_nom_opt>n.stores.e_nom].index:
+    vt.add(ledger, 'storage_unit', idx, bus, opt_p, year, year+15)
+
+    grown=n.stores.index[n.stores.e_nom_opt>n.stores.e_nom]
+    vt.add(ledger, 'H2_store', grown, None, n.stores.loc[grown,'e_nom_opt'].values, year, year+20)
+
+    for s in grown:
         n.stores.loc[s,'e_nom']+=n.stores.loc[s,'e_nom_opt']
-    return df,df_S
 
 def initial_storage(n):
     """ Updates the initial state of charge for storage units in the network.
@@ -550,7 +598,48 @@ def initial_storage(n):
     n.storage_units.state_of_charge_initial=initial
 
 
-def delete_gens(n,year,df,saved_potential,regional_potential):
+def _by_occurrence(amounts):
+    """ Splits a series into parts with unique index labels, in order of occurrence.
+
+    The k-th part holds the k-th occurrence of every label, so that applying
+    the parts one after another gives the same result as a row-by-row loop.
+    """
+    if amounts.empty:
+        return
+    rank=amounts.groupby(level=0).cumcount().values
+    for k in range(rank.max()+1):
+        yield amounts[rank==k]
+
+def retire_fixed_twins(n,amounts,regional_potential):
+    """ Retires capacity of the 'Fixed' twins of extendable generators.
+
+    The retired capacity is subtracted from the p_nom of the 'Fixed' generator (floored at zero)
+    and added to its p_nom_max. It is also given back to the p_nom_max of the extendable
+    generator, as long as this stays below the regional potential.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object to update.
+    amounts : pd.Series
+        The retired capacities, indexed by the names of the extendable generators.
+    regional_potential : float
+        The regional potential limit for generator capacities.
+
+    Returns:
+    --------
+    None
+    """
+    for part in _by_occurrence(amounts):
+        fixed='Fixed ' + part.index
+        v=part.values
+        p_nom=n.generators.loc[fixed,'p_nom'].values-v
+        n.generators.loc[fixed,'p_nom_max']+=v
+        cap=n.generators.loc[part.index,'p_nom_max'].values+v<regional_potential
+        n.generators.loc[part.index[cap],'p_nom_max']+=v[cap]
+        n.generators.loc[fixed,'p_nom']=np.where(p_nom<=0,0,p_nom)
+
+def delete_gens(n,year,ledger,saved_potential,regional_potential):
     """ Reduces or removes generator capacities in the network based on a specified year.
 
     This function identifies generators and links scheduled for removal or capacity reduction in the given year
@@ -564,8 +653,8 @@ def delete_gens(n,year,df,saved_potential,regional_potential):
         The network object containing the generators and links to be updated.
     year : int
         The year in which the capacity adjustments or removals are applied.
-    df : pd.DataFrame
-        A DataFrame tracking the generator capacities and their removal schedules.
+    ledger : dict
+        The vintage ledger (see Model_Code.vintage) with the generator capacities and their removal years.
     saved_potential : pd.Series
         A series tracking the remaining potential for each generator.
     regional_potential : float
@@ -575,22 +664,18 @@ def delete_gens(n,year,df,saved_potential,regional_potential):
     --------
     None
     """
-    wanted=df[{'bus','p_nom'}][df.year_removed==year]
+    wanted=vt.retiring(ledger, 'generation', year).p_nom
     wanted=wanted.groupby(level=0).sum()
-    for i in range(len(wanted.index)):
-        if wanted.index[i].split()[-1] not in ['biomass','OCGT','CCGT']:
-            n.generators.loc['Fixed ' + wanted.index[i], 'p_nom']-=wanted.loc[wanted.index[i],'p_nom']
-            n.generators.loc['Fixed ' + wanted.index[i], 'p_nom_max']+=wanted.loc[wanted.index[i],'p_nom']
-            saved_potential[wanted.index[i]]+=wanted.loc[wanted.index[i],'p_nom']
-            if n.generators.loc[wanted.index[i], 'p_nom_max'] + wanted.loc[wanted.index[i],'p_nom'] < regional_potential:
-                n.generators.loc[wanted.index[i], 'p_nom_max']+=wanted.loc[wanted.index[i],'p_nom']
-            if n.generators.loc['Fixed ' + wanted.index[i], 'p_nom']<=0:
-                n.generators.loc['Fixed ' + wanted.index[i], 'p_nom'] = 0
-        elif wanted.index[i].split()[-1] in ['OCGT','CCGT']:
-            n.links.loc[wanted.index[i], 'p_nom']-=wanted.loc[wanted.index[i],'p_nom']
-
-
-def delete_storage(n,year,df,df_H,df_S):
+    carrier=wanted.index.str.split().str[-1]
+    res=wanted[~carrier.isin(['biomass','OCGT','CCGT'])]
+    refund_potential(saved_potential, res)
+    retire_fixed_twins(n, res, regional_potential)
+
+    gas=wanted[carrier.isin(['OCGT','CCGT'])]
+    n.links.loc[gas.index, 'p_nom']-=gas.values
+
+
+def delete_storage(n,year,ledger):
     """ Reduces or removes storage capacities in the network based on a specified year.
 
     This function adjusts the nominal capacities (p_nom) of fixed storage units scheduled for removal
@@ -603,33 +688,31 @@ def delete_storage(n,year,df,df_H,df_S):
         The network object containing the storage units, links, and stores to be updated.
     year : int
         The year in which the capacity adjustments or removals are applied.
-    df : pd.DataFrame
-        A DataFrame tracking the storage unit capacities and their removal schedules.
-    df_H : pd.DataFrame
-        A DataFrame tracking the capacities and removal schedules for hydrogen-related links.
-    df_S : pd.DataFrame
-        A DataFrame tracking the capacities and removal schedules for hydrogen stores.
+    ledger : dict
+        The vintage ledger (see Model_Code.vintage) with the storage unit, hydrogen link and
+        hydrogen store capacities and their removal years.
 
     Returns:
     --------
     None
     """
 
-    wanted=df[{'bus','p_nom'}][df.year_removed==year]
-    for i in range(len(wanted.index)):
-        n.storage_units.loc['Fixed ' + wanted.index[i], 'p_nom']-=wanted.loc[wanted.index[i],'p_nom']
-        if n.storage_units.loc['Fixed ' + wanted.index[i], 'p_nom']<=0:
-            n.storage_units.loc['Fixed ' + wanted.index[i], 'p_nom'] = 0
+    wanted=vt.retiring(ledger, 'storage_unit', year)
+    # capacities retiring from the same unit are summed, then subtracted at once
+    retired=wanted.p_nom.groupby(level=0, sort=False).sum()
+    names='Fixed ' + retired.index
+    n.storage_units.loc[names,'p_nom']=(n.storage_units.loc[names,'p_nom']
+                                        - retired.values).clip(lower=0)
 
     #H2
-    wanted=df_H[df_H.year_removed==year]
-    
+    wanted=vt.retiring(ledger, 'H2_link', year)
+
     n.links.loc[wanted.index,'p_nom']-=wanted.p_nom
     n.links.loc[n.links.p_nom<0,'p_nom']=0
 
     #H2_store
-    wanted=df_S[df_S.year_removed==year]
-    
+    wanted=vt.retiring(ledger, 'H2_store', year)
+
     n.stores.loc[wanted.index,'e_nom']-=wanted.p_nom
     n.stores.loc[n.stores.e_nom<0,'e_nom']=0
 
@@ -657,18 +740,9 @@ def delete_original_RES(n,year,df,saved_potential,regional_potential):
     --------
     None
     """
-    wanted=df[{'bus','p_nom'}][df.year_removed==year]
-    for i in range(len(wanted.index)):
-        
-        n.generators.loc['Fixed ' + wanted.index[i], 'p_nom']-=wanted.loc[wanted.index[i],'p_nom']
-        n.generators.loc['Fixed ' + wanted.index[i], 'p_nom_max']+=wanted.loc[wanted.index[i],'p_nom']
-        saved_potential[wanted.index[i]]+=wanted.loc[wanted.index[i],'p_nom']
-        # n.generators.loc[wanted.index[i], 'p_nom_max']+=wanted.loc[wanted.index[i],'p_nom']
-        if n.generators.loc[wanted.index[i], 'p_nom_max'] + wanted.loc[wanted.index[i],'p_nom'] < regional_potential:
-            n.generators.loc[wanted.index[i], 'p_nom_max']+=wanted.loc[wanted.index[i],'p_nom']
-            
-        if n.generators.loc['Fixed ' + wanted.index[i], 'p_nom']<=0:
-            n.generators.loc['Fixed ' + wanted.index[i], 'p_nom'] = 0
+    wanted=df.p_nom[df.year_removed==year]
+    refund_potential(saved_potential, wanted)
+    retire_fixed_twins(n, wanted, regional_potential)
 
 def remove_phased_out (n):
     """
@@ -687,7 +761,10 @@ def remove_phased_out (n):
     None
     """
 
+    removed=[]
     for i in n.generators.index[n.generators.p_nom_extendable==False]:
         if 'Fixed ' not in i:
             if n.generators.p_nom[i] == 0:
-                n.remove('Generator', i)
\ No newline at end of file
+                n.remove('Generator', i)
+                removed.append(i)
+    rl.remove_components(n, 'Generator', removed)
\ No newline at end of file
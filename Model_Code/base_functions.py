@@ -11,6 +11,8 @@ import pypsa
 import logging
 import numpy as np
 
+import Model_Code.utils as ut
+
 logger = logging.getLogger(__name__)
 
 def set_line_s_max_pu(n):
@@ -53,8 +55,7 @@ def createFolder(directory):
     """
 
     try:
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+        os.makedirs(directory, exist_ok=True)
     except OSError:
         print ('Error: Creating directory. ' +  directory)
 
@@ -102,77 +103,48 @@ def H2_ready(n,year,fuel_cost):
     
     n.add("Carrier",'H2')
     n.add("Carrier",'H2_NG')
-    names=[]
-    for bus in n.buses.index[n.buses.carrier=='AC']:
-        n.add("Bus", f"{bus} H2_NG",carrier='H2_NG',
-              x=n.buses.loc[bus,'x'],
-              y=n.buses.loc[bus,'y']) #H2-Gas Mix bus
-        n.add("Link",f"{bus} Gas_input",
-              bus0=f"{bus} gas",bus1=f"{bus} H2_NG",
-              p_nom=n.links.loc[(n.links.bus1==bus)&(n.links.carrier=='CCGT'),'p_nom'],
-              p_nom_extendable=True) #Gas input to Mix from gas store
-        n.add("Bus", f"{bus} H2", carrier='H2',
-              x=n.buses.loc[bus,'x'],
-              y=n.buses.loc[bus,'y']) #H2 bus
-        n.add("Store",  f"{bus} H2",
-              bus= f"{bus} H2",carrier='H2',
-              e_nom_extendable=True,
-              capital_cost=264,
-              e_cyclic_per_period=False
-              )
-        n.add("Generator",f"{bus} H2 import",carrier='H2',
-                    bus=f"{bus} H2",
-                    marginal_cost = fuel_cost.loc[2020,'H2'],
-                    p_nom_extendable=True,
-                   ) # H2 imports from abroad
-
-        n.add("Link", f"{bus} H2_input",
-              bus0=f"{bus} H2",bus1=f"{bus} H2_NG",
-              capital_cost=18892.8, #94464*0.2 20% of CCGT CAPEX
-              p_nom_extendable=True) #H2 input from electrolyser
-        
-        n.add(
-            "Link",
-            f"{bus} electrolysis",
-            bus0=f"{bus}",
-            bus1=f"{bus} H2",
-            capital_cost=147832,
-            p_nom_extendable=True,
-            efficiency=0.8,
-        )
-            
-        n.add(
-            "Link",
-            f"{bus} fuel cell",
-            bus0=f"{bus} H2",
-            bus1=f"{bus}",
-            capital_cost=95234.84, # 164198*0.58
-            p_nom_extendable=True,
-            efficiency=0.58,
-        )
-    
-    
-        n.links.loc[(n.links.bus0==bus + ' gas')
-                &
-                (n.links.carrier=='CCGT'),'bus0']=f"{bus} H2_NG"
-
-        idx_el=n.links.loc[(n.links.bus0==bus)
-                &
-                (n.links.bus1==bus + ' H2')].index[0]
-        
-        idx_fc=n.links.loc[(n.links.bus1==bus)
-                &
-                (n.links.bus0==bus + ' H2')].index[0]
-
-        idx_ext=n.links.loc[(n.links.bus0==f"{bus} H2")
-                &
-                (n.links.bus1==f"{bus} H2_NG")].index[0]
-        
-        names.append(idx_el)
-        names.append(idx_fc)
-        names.append(idx_ext)
-        
-        
+    buses=n.buses.index[n.buses.carrier=='AC']
+    x=np.repeat(n.buses.loc[buses,'x'].values, 2)
+    y=np.repeat(n.buses.loc[buses,'y'].values, 2)
+
+    # H2-Gas Mix bus and H2 bus of every AC bus
+    n.madd("Bus", pd.Index(np.stack([buses + " H2_NG", buses + " H2"], axis=1).ravel()),
+           carrier=np.tile(['H2_NG','H2'], len(buses)), x=x, y=y)
+
+    # Links of every AC bus, in the order: Gas input to Mix from gas store, H2 input from
+    # electrolyser, electrolysis, fuel cell
+    ccgt=n.links.loc[n.links.carrier=='CCGT']
+    ccgt_p_nom=ccgt.groupby('bus1').p_nom.first().reindex(buses).values
+    suffixes=['Gas_input','H2_input','electrolysis','fuel cell']
+    links=pd.DataFrame({
+        'bus0':np.stack([buses + " gas", buses + " H2", buses, buses + " H2"], axis=1).ravel(),
+        'bus1':np.stack([buses + " H2_NG", buses + " H2_NG", buses + " H2", buses], axis=1).ravel(),
+        'p_nom':np.stack([ccgt_p_nom] + [np.zeros(len(buses))]*3, axis=1).ravel(),
+        'capital_cost':np.tile([0, 18892.8, #94464*0.2 20% of CCGT CAPEX
+                                147832,
+                                95234.84], # 164198*0.58
+                               len(buses)),
+        'efficiency':np.tile([1, 1, 0.8, 0.58], len(buses)),
+        'p_nom_extendable':True},
+        index=np.stack([buses + ' ' + suffix for suffix in suffixes], axis=1).ravel())
+    n.madd("Link", links.index, **links)
+
+    n.madd("Store", buses + " H2",
+           bus=(buses + " H2").values, carrier='H2',
+           e_nom_extendable=True,
+           capital_cost=264,
+           e_cyclic_per_period=False)
+    n.madd("Generator", buses + " H2 import", carrier='H2',
+           bus=(buses + " H2").values,
+           marginal_cost=fuel_cost.loc[2020,'H2'],
+           p_nom_extendable=True) # H2 imports from abroad
+
+    # CCGTs are fed from the H2-Gas Mix bus
+    rewired=(n.links.carrier=='CCGT') & n.links.bus0.isin(buses + ' gas')
+    n.links.loc[rewired,'bus0']=n.links.loc[rewired,'bus0'].str[:-len(' gas')] + ' H2_NG'
+
+    names=np.stack([buses + ' electrolysis', buses + ' fuel cell', buses + ' H2_input'],
+                   axis=1).ravel()
     df_H2=pd.DataFrame({'p_nom':np.zeros(len(names)),
                      'year_added':[year]*len(names),
                      'year_removed':[year+20]*len(names)},
@@ -183,9 +155,7 @@ def H2_ready(n,year,fuel_cost):
                      'year_removed':[year+20]*len(n.stores.index)},
                     index=n.stores.index)
 
-    
-    indices=[elem for elem in df_H2.index if 'input' in elem]
-    df_H2.loc[indices,'year_removed']+=20
+    df_H2.loc[df_H2.index.str.endswith(' H2_input'),'year_removed']+=20
     return df_H2,df_store
 
 def convert_opt_to_conv(n,year,res_add,name, fuel_cost):
@@ -212,25 +182,16 @@ def convert_opt_to_conv(n,year,res_add,name, fuel_cost):
         A DataFrame tracking the converted generators with their capacities.
     """
     n.add("Carrier",'gas',co2_emissions=0.187)
-    for bus in n.buses.index[n.buses.carrier=='AC']:
-        n.add("Bus", f"{bus} gas",carrier='gas',
-              x=n.buses.loc[bus,'x'],y=n.buses.loc[bus,'y']) #Gas bus
-        n.add("Generator",f"{bus} Gas import",carrier='gas',
-                    bus=f"{bus} gas",marginal_cost = fuel_cost.loc[2020,'gas'],
-                    p_nom=1e9
-                   ) # Gas imports 
-
-    idx=[]
-    bus=[]
-    opt_p=[]
-        
-        
-    for i in range(len(n.generators[n.generators.p_nom_extendable==True].index)):
-        idx.append(n.generators[n.generators.p_nom_extendable==True].index[i])
-        bus.append(n.generators[n.generators.p_nom_extendable==True].bus[i])
-        opt_p.append(0)#n.generators[n.generators.p_nom_extendable==True].p_nom_opt[i]
-    df=pd.DataFrame({'bus':bus,'p_nom':opt_p,'year_added':[year]*len(opt_p),'year_removed':[year+25]*len(opt_p)})
-    df.index=idx
+    buses=n.buses.index[n.buses.carrier=='AC']
+    n.madd("Bus", buses + " gas", carrier='gas',
+           x=n.buses.loc[buses,'x'].values, y=n.buses.loc[buses,'y'].values) #Gas bus
+    n.madd("Generator", buses + " Gas import", carrier='gas',
+           bus=(buses + " gas").values, marginal_cost=fuel_cost.loc[2020,'gas'],
+           p_nom=1e9) # Gas imports
+
+    ext=n.generators.index[n.generators.p_nom_extendable==True]
+    df=pd.DataFrame({'bus':n.generators.loc[ext,'bus'].values,'p_nom':0,
+                     'year_added':year,'year_removed':year+25}, index=ext)
     
     c=pd.read_csv('{}/conventional_basic_removal.csv'.format(name), index_col=0)
     c=c[['carrier','p_nom','bus']]
@@ -243,73 +204,60 @@ def convert_opt_to_conv(n,year,res_add,name, fuel_cost):
     c=c.stack().reset_index()
     c=c[['carrier','p_nom','bus']]
     c.index=c.bus + ' ' + c.carrier
-    c.to_csv('{}/extendable_base_addition.csv'.format(name))
-    p_max=0
-    Value=0
-    for i in range(len(df.index)):
-        if idx[i] in n.generators_t.p_max_pu.columns:
-            print('Renewable Extendable: This is executed for {}'.format(idx[i]))
-            y2=list(n.generators_t.p_max_pu[idx[i]])
-
-            g=n.generators.loc[n.generators.index == idx[i]].copy()
-            if g.carrier[0] != 'ror':
-                if idx[i] in res_add.index:
-                    Value=res_add.p_nom[idx[i]]
-                    p_max=g.p_nom_max[0]
-                    if p_max <0:
-                        p_max=0
-                else:
-                    Value=0
-#                y1=y2*Value
-                if Value >=p_max:
-                    Value=p_max
-                n.generators.loc[idx[i], 'p_nom_max']-= Value
-                n.add("Generator","Fixed " + idx[i],
-                      bus=g.bus[0],p_nom=Value,p_nom_opt=0,marginal_cost=g.marginal_cost[0],
-                      capital_cost=0, carrier=g.carrier[0],p_nom_extendable=False,
-                      p_nom_max=p_max,control=g.control[0],
-                      efficiency=g.efficiency[0], p_min_pu=0, p_max_pu=y2)
-                n.generators.loc["Fixed " + idx[i],'weight']=g.weight[0]
-                n.generators_t.p["Fixed " + idx[i]]=0
-
-    for bus in n.buses.index[n.buses.carrier=='AC']:
-        for tech in ['CCGT','OCGT']:
-            if bus + ' ' + tech in c.index:
-                Value=c.loc[bus + ' ' + tech,'p_nom']
-            else:
-                Value=0
-
-            try:
-                g=n.generators.loc[(n.generators.bus== bus)
-                                   &
-                                   (n.generators.carrier==tech)]
-                n.remove('Generator',bus + ' ' + tech)
-                n.add("Link",name=bus + ' ' + tech,
-                      bus0=f"{bus} gas",bus1=bus,
-                      p_nom=Value/0.61 if tech =='CCGT' else Value/0.40,
-                      carrier=tech,
-                      efficiency=0.61 if tech =='CCGT' else 0.40,
-                      p_nom_extendable=True,
-                      capital_cost=g.capital_cost[0]*0.61 if tech =='CCGT' \
-                          else g.capital_cost[0]*0.40,
-                      marginal_cost=4.4*0.61 if tech=='CCGT' \
-                      else 4.5*0.40)
-            except:
-                n.add("Link",name=bus + ' ' + tech,
-                      bus0=f"{bus} gas",bus1=bus,
-                      p_nom=Value/0.61 if tech =='CCGT' else Value/0.40,
-                      carrier=tech,
-                      efficiency=0.61 if tech =='CCGT' else 0.40,
-                      p_nom_extendable=True,
-                      capital_cost=94469*0.61 if tech =='CCGT' \
-                          else 42234.56*0.40,
-                      marginal_cost=4.4*0.61 if tech=='CCGT' \
-                      else 4.5*0.40)
-            
-
-
-    for i in n.generators.index:
-        n.generators.loc[i,'p_nom_opt']=0
+    ut.to_csv_atomic(c, '{}/extendable_base_addition.csv'.format(name))
+
+    # Renewables with profiles (except ror): a 'Fixed' twin holds the base addition
+    g=n.generators.loc[ext[ext.isin(n.generators_t.p_max_pu.columns)]]
+    g=g[g.carrier != 'ror']
+    print('Renewable Extendable: This is executed for {}'.format(', '.join(g.index)))
+    in_res=g.index.isin(res_add.index)
+    # the potential of the last generator with a base addition also applies to those without
+    last=np.maximum.accumulate(np.where(in_res, np.arange(len(g)), -1))
+    p_max=np.where(last >= 0, g.p_nom_max.clip(lower=0).values[np.maximum(last, 0)], 0)
+    Value=np.where(in_res, res_add.p_nom.reindex(g.index).values, 0)
+    Value=np.where(Value >= p_max, p_max, Value)
+    n.generators.loc[g.index, 'p_nom_max']-= Value
+
+    fixed="Fixed " + g.index
+    n.madd("Generator", fixed,
+           bus=g.bus.values, p_nom=Value, p_nom_opt=0, marginal_cost=g.marginal_cost.values,
+           capital_cost=0, carrier=g.carrier.values, p_nom_extendable=False,
+           p_nom_max=p_max, control=g.control.values,
+           efficiency=g.efficiency.values, p_min_pu=0,
+           p_max_pu=pd.DataFrame(n.generators_t.p_max_pu[g.index].values,
+                                 index=n.snapshots, columns=fixed),
+           weight=g.weight.values)
+    n.generators_t.p=pd.concat([n.generators_t.p,
+                                pd.DataFrame(0., index=n.snapshots, columns=fixed)], axis=1)
+
+    # Gas power plants become links from the gas bus; the base capacity is kept as p_nom
+    eff={'CCGT': 0.61, 'OCGT': 0.40}
+    default_capital_cost={'CCGT': 94469, 'OCGT': 42234.56}
+    marginal_cost={'CCGT': 4.4, 'OCGT': 4.5}
+    tech=np.tile(['CCGT','OCGT'], len(buses))
+    link_bus=np.repeat(buses, 2)
+    links=pd.Index(link_bus + ' ' + tech)
+    efficiency=pd.Series(tech).map(eff).values
+
+    Value=np.where(links.isin(c.index), c.p_nom.reindex(links).values, 0)
+    existing=links.isin(n.generators.index)
+    gas_gens=(n.generators[n.generators.carrier.isin(['CCGT','OCGT'])]
+              .drop_duplicates(['bus','carrier']).set_index(['bus','carrier']).capital_cost)
+    at_bus=pd.MultiIndex.from_arrays([link_bus, tech])
+    found=existing & at_bus.isin(gas_gens.index)
+    capital_cost=np.where(found, gas_gens.reindex(at_bus).values,
+                          pd.Series(tech).map(default_capital_cost).values)
+    n.mremove('Generator', links[existing])
+    n.madd("Link", links,
+           bus0=link_bus + " gas", bus1=link_bus,
+           p_nom=Value/efficiency,
+           carrier=tech,
+           efficiency=efficiency,
+           p_nom_extendable=True,
+           capital_cost=capital_cost*efficiency,
+           marginal_cost=pd.Series(tech).map(marginal_cost).values*efficiency)
+
+    n.generators['p_nom_opt']=0.
     
     
     # Biomass & ROR
@@ -320,22 +268,25 @@ def convert_opt_to_conv(n,year,res_add,name, fuel_cost):
                              2/100.) *
                              2500*1e3 * 1)
 
-    for idx in n.generators.index[(n.generators.carrier=='biomass') | (n.generators.carrier=='ror')]:
-        n.generators.loc[n.generators.index == idx,'capital_cost']= cap_bio if idx.split()[-1] == 'biomass' else cap_ror
-        g=n.generators.loc[n.generators.index == idx].copy()
-        n.add("Generator","Fixed " + idx,
-              bus=g.bus[0],p_nom=g.p_nom[0],p_nom_opt=0,marginal_cost=g.marginal_cost[0],
-              capital_cost=0, carrier=g.carrier[0],p_nom_extendable=False,
-              p_nom_max=0,efficiency=g.efficiency[0])
-        n.generators_t.p["Fixed " + idx]=0
-        n.generators.loc[n.generators.index == idx,'p_nom_max']=0
-        n.generators.loc[n.generators.index == idx,'p_nom_extendable']=True
-        n.generators.loc[n.generators.index == idx,'p_nom']=0
-        n.generators.loc[n.generators.index == idx,'p_nom_opt']=0
-
-        if g.carrier[0] == 'ror':
-            y2=list(n.generators_t.p_max_pu[g.index[0]])
-            n.generators_t.p_max_pu['Fixed '  + idx] = y2
+    idx=n.generators.index[(n.generators.carrier=='biomass') | (n.generators.carrier=='ror')]
+    n.generators.loc[idx,'capital_cost']=np.where(idx.str.split().str[-1] == 'biomass',
+                                                  cap_bio, cap_ror)
+    g=n.generators.loc[idx].copy()
+    ror=g.index[g.carrier == 'ror']
+    fixed="Fixed " + idx
+    n.madd("Generator", fixed,
+           bus=g.bus.values, p_nom=g.p_nom.values, p_nom_opt=0,
+           marginal_cost=g.marginal_cost.values,
+           capital_cost=0, carrier=g.carrier.values, p_nom_extendable=False,
+           p_nom_max=0, efficiency=g.efficiency.values,
+           p_max_pu=pd.DataFrame(n.generators_t.p_max_pu[ror].values,
+                                 index=n.snapshots, columns="Fixed " + ror))
+    n.generators_t.p=pd.concat([n.generators_t.p,
+                                pd.DataFrame(0., index=n.snapshots, columns=fixed)], axis=1)
+    n.generators.loc[idx,'p_nom_max']=0
+    n.generators.loc[idx,'p_nom_extendable']=True
+    n.generators.loc[idx,'p_nom']=0
+    n.generators.loc[idx,'p_nom_opt']=0
     return df
 
 def convert_opt_storage_to_conv(n,year):
@@ -358,32 +309,25 @@ def convert_opt_storage_to_conv(n,year):
         A DataFrame tracking the converted storage units with their capacities.
     """
 
-    idx=[]
-    bus=[]
-    opt_p=[]
-    for i in range(len(n.storage_units[n.storage_units.p_nom_extendable==True].index)):
-        idx.append(n.storage_units[n.storage_units.p_nom_extendable==True].index[i])
-        bus.append(n.storage_units[n.storage_units.p_nom_extendable==True].bus[i])
-        opt_p.append(n.storage_units[n.storage_units.p_nom_extendable==True].p_nom_opt[i])#n.generators[n.generators.p_nom_extendable==True].p_nom_opt[i]
-    df=pd.DataFrame({'bus':bus,'p_nom':opt_p,'year_added':[year]*len(opt_p),'year_removed':[year+15]*len(opt_p)})
-    df.index=idx
-    
-    for i in range(len(df.index)):
-        print('Storage Extendable: This is executed for {}'.format(idx[i]))
-
-        g=n.storage_units.loc[n.storage_units.index == idx[i]].copy()
-        Value=df.p_nom[idx[i]]
-        n.add("StorageUnit","Fixed " + idx[i],
-              bus=g.bus[0],p_nom=Value,p_nom_opt=0,marginal_cost=g.marginal_cost[0],
-              capital_cost=0, max_hours=g.max_hours[0], carrier=g.carrier[0],p_nom_extendable=False,
-              p_nom_max=g.p_nom_max[0],control=g.control[0], p_min_pu=g.p_min_pu[0],
-              efficiency_dispatch=g.efficiency_dispatch[0] , efficiency_store=g.efficiency_store[0],
-              cyclic_state_of_charge=g.cyclic_state_of_charge[0] )
-        
-        n.storage_units_t.p_store["Fixed " + idx[i]]=n.storage_units_t.p_store[ idx[i]]*0
-        n.storage_units_t.p_dispatch["Fixed " + idx[i]]=n.storage_units_t.p_dispatch[ idx[i]]*0
+    ext=n.storage_units.index[n.storage_units.p_nom_extendable==True]
+    g=n.storage_units.loc[ext].copy()
+    df=pd.DataFrame({'bus':g.bus.values,'p_nom':g.p_nom_opt.values,
+                     'year_added':year,'year_removed':year+15}, index=ext)
+    print('Storage Extendable: This is executed for {}'.format(', '.join(ext)))
+
+    fixed="Fixed " + ext
+    n.madd("StorageUnit", fixed,
+           bus=g.bus.values, p_nom=df.p_nom.values, p_nom_opt=0,
+           marginal_cost=g.marginal_cost.values,
+           capital_cost=0, max_hours=g.max_hours.values, carrier=g.carrier.values,
+           p_nom_extendable=False,
+           p_nom_max=g.p_nom_max.values, control=g.control.values, p_min_pu=g.p_min_pu.values,
+           efficiency_dispatch=g.efficiency_dispatch.values, efficiency_store=g.efficiency_store.values,
+           cyclic_state_of_charge=g.cyclic_state_of_charge.values)
+    for attr in ['p_store', 'p_dispatch']:
+        pnl=n.storage_units_t[attr]
+        n.storage_units_t[attr]=pd.concat([pnl, (pnl[ext]*0).set_axis(fixed, axis=1)], axis=1)
 
 ## TODO: Add Max hours to n.storage_units
-    for i in n.storage_units.index:
-        n.storage_units.loc[i,'p_nom_opt']=0
+    n.storage_units['p_nom_opt']=0.
     return df
\ No newline at end of file
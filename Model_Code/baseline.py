@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+© Anas Abuzayed 2025
+
+This module prepares the 2020 baseline of the myopic optimization from the
+PyPSA-Eur network: the renewable profiles and availabilities are updated, the
+removal data of the existing plants (conventional, RES, biomass, coal) is read
+or created in the network folder, the optimized capacities are converted to
+the baseline, the H2 infrastructure is added, the load is scaled to 540 TWh
+and load generators are added to avoid infeasibilities.
+
+All inputs of the baseline are the network file, the files of its network
+folder, the data folder and the code of this and the modules it calls, which
+is what the cache key of the baseline covers (see Model_Code.cache).
+"""
+
+import os
+import logging
+import pandas as pd
+import pypsa
+
+import Model_Code.data_processing as dp
+import Model_Code.base_functions as bf
+import Model_Code.Myopic as mp
+import Model_Code.vintage as vt
+
+logger = logging.getLogger(__name__)
+
+
+def read_data(n, folder_name):
+    """ Reads or creates the removal and addition data of the existing plants.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object.
+    folder_name : str
+        The network folder holding the csv files.
+
+    Returns:
+    --------
+    tuple of pd.DataFrame
+        The conventional removal data, the RES removal data and the RES
+        addition data.
+    """
+    conventional_base = dp.Base_Removal_Data(n, folder_name)
+
+    if os.path.exists(f"{folder_name}/res_basic_removal.csv"):
+        RES_base_remove = pd.read_csv(f"{folder_name}/res_basic_removal.csv", index_col=0)
+    else:
+        _, RES_base_remove = dp.RES_data(n, folder_name)
+
+    if os.path.exists(f"{folder_name}/res_basic_addition.csv"):
+        RES_base_addition = pd.read_csv(f"{folder_name}/res_basic_addition.csv", index_col=0)
+    else:
+        RES_base_addition, _ = dp.RES_data(n, folder_name)
+
+    return conventional_base, RES_base_remove, RES_base_addition
+
+
+def prepare_baseline(network_filename, name, fuel_cost):
+    """ Builds the 2020 baseline network and its tracking tables.
+
+    Parameters:
+    -----------
+    network_filename : str
+        The input network (.nc).
+    name : str
+        The network folder (the network file without .nc).
+    fuel_cost : pd.DataFrame
+        Fuel costs per year (content of fuel_cost.csv).
+
+    Returns:
+    --------
+    Network
+        The baseline network.
+    dict
+        The tracking tables: the vintage ledger ('ledger'), the removal data
+        of all plants ('removal_data'), of the conventional plants
+        ('conventional_base') and of the renewables ('renewables').
+    """
+    # Load the PyPSA Network
+    n = pypsa.Network(network_filename)
+    n.generators["p_nom_min"] = 0
+
+    # Update renewable profiles, availability, etc.
+    dp.update_rens_profiles(n, reference_year=2013, name=name)
+    bf.update_availability_profiles(n, name)
+
+    # Read or create removal data (conventional, RES, biomass, coal, etc.)
+    Bio_data = dp.Biomass_data(n, name)
+    conventional_base, RES_base_remove, RES_base_addition = read_data(n, name)
+    coal_data = dp.Correct_coal(n, name)
+
+    # Combine data
+    conventional_base = pd.concat([conventional_base, coal_data])
+    conventional_base = pd.concat([conventional_base, Bio_data])
+    removal_data = pd.concat([conventional_base, RES_base_remove])
+    # Make Coal/Lignite removed only based on linear phase-out
+    xs=conventional_base.loc[(conventional_base.carrier=='lignite')
+                          |
+                          (conventional_base.carrier=='coal')].index
+    conventional_base.drop(xs,inplace=True)
+
+    # Example: separate out renewables
+    renewables = pd.concat([
+        removal_data[removal_data.carrier=='solar'],
+        removal_data[removal_data.carrier=='onwind'],
+        removal_data[removal_data.carrier=='offwind-ac'],
+        removal_data[removal_data.carrier=='offwind-dc']
+    ])
+
+    # Convert the network to a baseline:
+    # Vintage ledger of all capacity additions and their retirement years
+    ledger = vt.new_ledger()
+    vt.add_frame(ledger, 'generation',
+                 bf.convert_opt_to_conv(n, 2020, RES_base_addition, name=name, fuel_cost=fuel_cost))
+    vt.add_frame(ledger, 'storage_unit', bf.convert_opt_storage_to_conv(n, 2020))
+    df_H2, df_H2_store = bf.H2_ready(n, 2020, fuel_cost=fuel_cost)
+    vt.add_frame(ledger, 'H2_link', df_H2)
+    vt.add_frame(ledger, 'H2_store', df_H2_store)
+
+    # Update load
+    # Example: scale to match some absolute TWh
+    mp.update_load(n, 540 / (n.loads_t.p_set.sum().sum() / 1000000))
+
+    n.lines.s_max_pu = 1.0 # Relax transmission lines contingency limit
+    n.storage_units.state_of_charge_initial = 0
+
+    # Add a large "load" generator with high marginal cost to avoid infeasibilities
+    n.add("Carrier", "Load")
+    n.madd("Generator",
+           n.buses.index[n.buses.carrier=='AC'],
+           " load",
+           bus=n.buses.index[n.buses.carrier=='AC'],
+           carrier='load',
+           marginal_cost=1e5,
+           p_nom=1e6
+           )
+
+    state = {'ledger': ledger, 'removal_data': removal_data,
+             'conventional_base': conventional_base, 'renewables': renewables}
+    return n, state
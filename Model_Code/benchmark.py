@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+© Anas Abuzayed 2025
+
+This module compares the solver profiles of the config file (see
+solving.solver_profiles), e.g. the open-source HiGHS interior point against
+the Gurobi barrier. Every profile is run on the same networks for the first
+years of the myopic optimization with profiling enabled, and the wall times
+of the build, solve and read phases are collected into one table:
+
+    python -m Model_Code.benchmark --clusters 4 13 --profiles gurobi highs
+"""
+
+import argparse
+import logging
+
+import pandas as pd
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# Stages of the run profile that belong to the optimization
+SOLVE_STAGES = ['lopf_build', 'lopf_solve', 'lopf_read']
+
+
+def benchmark_solvers(config, clusters=(4, 13), profiles=('gurobi', 'highs'),
+                      end_year=2021, output_dir='Results/benchmark'):
+    """ Runs the model with every solver profile and compares the optimization times.
+
+    Parameters:
+    -----------
+    config : dict
+        The base configuration.
+    clusters : list-like of int, optional
+        The networks to run. Default is the 4 and 13 cluster networks.
+    profiles : list-like of str, optional
+        The solver profiles to compare. Default is gurobi and highs.
+    end_year : int, optional
+        Last year of the runs. Default is 2021, i.e. the 2020 baseline and one
+        myopic year.
+    output_dir : str, optional
+        Folder of the runs ('<output_dir>/<clusters>_<profile>') and of the
+        table solver_benchmark.csv. Default is 'Results/benchmark'.
+
+    Returns:
+    --------
+    pd.DataFrame
+        Wall time of the build, solve and read phases summed over the years,
+        the total of the optimization and the objective of the last year,
+        indexed by clusters and profile.
+    """
+    import Model
+    import pypsa
+
+    rows = []
+    for cluster in clusters:
+        for profile in profiles:
+            folder = f"{output_dir}/{cluster}_{profile}"
+            logger.info(f"Benchmark of solver profile '{profile}' on {cluster} clusters")
+            # Every year must be solved, not restored from the solution cache
+            overrides = {'solving.solver.profile': profile, 'profile': True,
+                         'checkpoint': False, 'plotting.mode': 'off',
+                         'cache.years': False}
+            result = Model.main(config=config, clusters=cluster, end_year=end_year,
+                                output_dir=folder, overrides=overrides)
+
+            stages = pd.read_csv(f"{result['directory']}/profile.csv")
+            wall = stages[stages.stage.isin(SOLVE_STAGES)].groupby('stage').wall_s.sum()
+            row = {'clusters': cluster, 'profile': profile}
+            row.update({stage: wall.get(stage, float('nan')) for stage in SOLVE_STAGES})
+            row['total_s'] = wall.sum()
+            row['objective'] = pypsa.Network(f"{result['directory']}/{end_year}.nc").objective
+            rows.append(row)
+
+    table = pd.DataFrame(rows).set_index(['clusters', 'profile'])
+    table.to_csv(f"{output_dir}/solver_benchmark.csv")
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the solver profiles of the config file.")
+    parser.add_argument("--config", default="config.yaml",
+                        help="configuration file (default: config.yaml)")
+    parser.add_argument("--clusters", type=int, nargs='+', default=[4, 13],
+                        help="networks to run (default: 4 13)")
+    parser.add_argument("--profiles", nargs='+', default=['gurobi', 'highs'],
+                        help="solver profiles to compare (default: gurobi highs)")
+    parser.add_argument("--end-year", type=int, default=2021, metavar="YEAR",
+                        help="last year of the runs (default: 2021)")
+    parser.add_argument("--output-dir", default="Results/benchmark",
+                        help="benchmark folder (default: Results/benchmark)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with open(args.config, "r") as file:
+        config = yaml.load(file, Loader=yaml.FullLoader)
+    table = benchmark_solvers(config, args.clusters, args.profiles,
+                              args.end_year, args.output_dir)
+    print(table.round(2).to_string())
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+© Anas Abuzayed 2025
+
+This module keeps the content-addressed cache of the model runs. An entry is
+stored under a key that is a hash of everything it was computed from, so any
+run with the same inputs reuses it, and a change of any input leads to a new
+key instead of a stale result.
+
+The prepared 2020 baseline (see Model_Code.baseline: the network after the
+data processing, the conversion to the myopic baseline, H2_ready, the load
+scaling and the load generators, with its tracking tables) is cached under the
+hash of the input network, the files of its network folder (profiles, removal
+and addition data) and of the data folder, the code of the modules building it
+and the settings it depends on.
+
+The solution of every year is cached under the hash of the network right
+before the solve (all input attributes of all components) and of the settings
+of the optimization. Scenarios of a sweep that are identical up to some year
+(e.g. the H2 CAPEX support starting in 2030) thereby solve their shared years
+once; the other runs load the stored solution instead of solving.
+"""
+
+import os
+import glob
+import time
+import pickle
+import hashlib
+import logging
+
+import yaml
+import pypsa
+
+import Model_Code.solving as sv
+import Model_Code.profiling as pf
+
+logger = logging.getLogger(__name__)
+
+# Modules whose code builds the baseline; a change of their code invalidates it
+BASELINE_MODULES = ['baseline', 'data_processing', 'base_functions', 'Myopic', 'vintage',
+                    'H2_Ready', 'roles', 'utils']
+
+# Tracking tables stored next to the baseline network
+BASELINE_KEYS = ['ledger', 'removal_data', 'conventional_base', 'renewables']
+
+# Modules whose code builds the optimization problem of a year
+SOLVE_MODULES = ['solving', 'Constraints']
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """ Returns the SHA-1 hash of the content of a file.
+
+    Parameters:
+    -----------
+    path : str
+        The file to hash.
+    chunk_size : int, optional
+        Bytes read at a time. Default is 1 MB.
+
+    Returns:
+    --------
+    str
+        The hex digest.
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _folder_digest(key, directory):
+    """Updates key with the relative path and content of every file below directory."""
+    for path in sorted(glob.glob(os.path.join(directory, '**', '*'), recursive=True)):
+        if os.path.isfile(path) and not path.endswith('.tmp'):
+            key.update(os.path.relpath(path, directory).encode())
+            key.update(file_digest(path).encode())
+
+
+def baseline_key(network_filename, settings=None, data_dir='data'):
+    """ Computes the cache key of the prepared 2020 baseline.
+
+    The files of the network folder are part of the key. A first build creates
+    some of them (e.g. the removal data), so its key must be computed again
+    after the build before storing it.
+
+    Parameters:
+    -----------
+    network_filename : str
+        The input network (.nc); its network folder is the file name
+        without .nc.
+    settings : dict, optional
+        Further settings the baseline depends on (e.g. the clusters).
+    data_dir : str, optional
+        The folder of the input data, all files of which are hashed.
+        Default is 'data'.
+
+    Returns:
+    --------
+    str
+        The hex digest of the inputs.
+    """
+    key = hashlib.sha1()
+    key.update(file_digest(network_filename).encode())
+    key.update(b'network folder')
+    _folder_digest(key, network_filename[:-3])
+    key.update(b'data folder')
+    _folder_digest(key, data_dir)
+    code_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in BASELINE_MODULES:
+        key.update(file_digest(os.path.join(code_dir, f"{module}.py")).encode())
+    key.update(yaml.safe_dump(settings or {}, sort_keys=True).encode())
+    return key.hexdigest()
+
+
+def _entry_files(directory, stem):
+    """Returns the network and state file names of a cache entry."""
+    return (os.path.join(directory, f"{stem}.nc"),
+            os.path.join(directory, f"{stem}.pkl"))
+
+
+def _write_entry(directory, stem, n, state):
+    """ Writes a network and its state as a cache entry. Both files are moved in
+    place after writing, the state file last, so readers never see a partial
+    entry (e.g. of a concurrent run of a sweep). """
+    os.makedirs(directory, exist_ok=True)
+    network_fn, state_fn = _entry_files(directory, stem)
+    suffix = f".{os.getpid()}.tmp"
+
+    n.export_to_netcdf(network_fn + suffix)
+    os.replace(network_fn + suffix, network_fn)
+    with open(state_fn + suffix, 'wb') as file:
+        pickle.dump(state, file)
+    os.replace(state_fn + suffix, state_fn)
+
+
+def _read_entry(directory, stem):
+    """Reads a cache entry, returns None if there is no complete entry."""
+    network_fn, state_fn = _entry_files(directory, stem)
+    if not (os.path.exists(network_fn) and os.path.exists(state_fn)):
+        return None
+    with open(state_fn, 'rb') as file:
+        state = pickle.load(file)
+    return pypsa.Network(network_fn), state
+
+
+def save_baseline(directory, key, n, state):
+    """ Stores the prepared 2020 baseline in the cache.
+
+    Parameters:
+    -----------
+    directory : str
+        The cache folder.
+    key : str
+        The cache key, see baseline_key.
+    n : Network
+        The prepared network.
+    state : dict
+        The tracking tables (e.g. the locals() of the setup); only the keys
+        in BASELINE_KEYS are stored.
+
+    Returns:
+    --------
+    None
+    """
+    _write_entry(directory, f"baseline-{key}", n, {k: state[k] for k in BASELINE_KEYS})
+    logger.info(f"Baseline stored in the cache ({key[:12]})")
+
+
+def load_baseline(directory, key):
+    """ Restores the prepared 2020 baseline from the cache.
+
+    Parameters:
+    -----------
+    directory : str
+        The cache folder.
+    key : str
+        The cache key, see baseline_key.
+
+    Returns:
+    --------
+    tuple or None
+        The network and the tracking tables (dict with the keys in
+        BASELINE_KEYS), or None if the cache holds no baseline for key.
+    """
+    entry = _read_entry(directory, f"baseline-{key}")
+    if entry is not None:
+        logger.info(f"Baseline restored from the cache ({key[:12]})")
+    return entry
+
+
+def network_digest(n):
+    """ Returns a hash of the input data of a network: the snapshots and
+    weightings, and every input attribute (static and time-varying) of every
+    component. Outputs of a previous solve and custom columns are not part of it.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object.
+
+    Returns:
+    --------
+    str
+        The hex digest of the network data.
+    """
+    key = hashlib.sha1()
+    key.update(str(list(n.snapshots)).encode())
+    key.update(sv._hash_frame(n.snapshot_weightings).encode())
+    for c in n.iterate_components():
+        inputs = c.attrs.index[c.attrs.status.str.startswith('Input')]
+        static = c.df[c.df.columns.intersection(inputs)]
+        key.update(f"{c.name} {list(static.columns)}".encode())
+        key.update(sv._hash_frame(static).encode())
+        for attr in sorted(inputs.intersection(list(c.pnl))):
+            if not c.pnl[attr].empty:
+                key.update(f"{c.name} {attr} {list(c.pnl[attr].columns)}".encode())
+                key.update(sv._hash_frame(c.pnl[attr]).encode())
+    return key.hexdigest()
+
+
+def year_key(n, config):
+    """ Computes the cache key of the solution of the current year.
+
+    Parameters:
+    -----------
+    n : Network
+        The network right before the solve, with opts set.
+    config : dict
+        The model configuration. The solving section, the CCL limits (if
+        'CCL' is in n.opts) and the code of SOLVE_MODULES are hashed.
+
+    Returns:
+    --------
+    str
+        The hex digest of the network and the settings.
+    """
+    solving = {k: v for k, v in config['solving'].items() if k != 'tmpdir'}
+    settings = {'solving': solving, 'opts': list(n.opts), 'pypsa': pypsa.__version__}
+    if 'CCL' in n.opts:
+        limits = config['scenario_settings'].get('agg_p_nom_limits')
+        settings['CCL'] = file_digest(limits) if limits and os.path.isfile(limits) else limits
+
+    key = hashlib.sha1(network_digest(n).encode())
+    code_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in SOLVE_MODULES:
+        key.update(file_digest(os.path.join(code_dir, f"{module}.py")).encode())
+    key.update(yaml.safe_dump(settings, sort_keys=True).encode())
+    return key.hexdigest()
+
+
+def save_solution(directory, key, n, result):
+    """ Stores the solution of the network in the cache: the output attributes
+    of all components (e.g. p_nom_opt, p, marginal_price), the objective and the
+    solver status.
+
+    Parameters:
+    -----------
+    directory : str
+        The cache folder.
+    key : str
+        The cache key, see year_key.
+    n : Network
+        The solved network.
+    result : tuple of str
+        The solver status and termination condition.
+
+    Returns:
+    --------
+    None
+    """
+    static, series = {}, {}
+    for c in n.iterate_components():
+        outputs = c.attrs.index[c.attrs.status == 'Output']
+        static[c.name] = c.df[c.df.columns.intersection(outputs)]
+        series[c.name] = {attr: c.pnl[attr] for attr in outputs.intersection(list(c.pnl))
+                          if not c.pnl[attr].empty}
+    solution = {'static': static, 'series': series, 'result': tuple(result),
+                'objective': n.objective,
+                'objective_constant': getattr(n, 'objective_constant', None)}
+
+    os.makedirs(directory, exist_ok=True)
+    solution_fn = os.path.join(directory, f"solution-{key}.pkl")
+    with open(solution_fn + f".{os.getpid()}.tmp", 'wb') as file:
+        pickle.dump(solution, file)
+    os.replace(solution_fn + f".{os.getpid()}.tmp", solution_fn)
+
+
+def load_solution(directory, key, n):
+    """ Assigns a cached solution to the network.
+
+    Parameters:
+    -----------
+    directory : str
+        The cache folder.
+    key : str
+        The cache key, see year_key.
+    n : Network
+        The network right before the solve; the solution is written into it.
+
+    Returns:
+    --------
+    tuple of str or None
+        The solver status and termination condition of the cached solve, or
+        None if the cache holds no solution for key.
+    """
+    solution_fn = os.path.join(directory, f"solution-{key}.pkl")
+    if not os.path.exists(solution_fn):
+        return None
+    with open(solution_fn, 'rb') as file:
+        solution = pickle.load(file)
+    # Mark the entry as used, see prune_solutions
+    os.utime(solution_fn)
+
+    for c, static in solution['static'].items():
+        df = n.df(c)
+        for attr in static.columns:
+            df[attr] = static[attr]
+    for c, series in solution['series'].items():
+        pnl = n.pnl(c)
+        for attr, values in series.items():
+            pnl[attr] = values
+    n.objective = solution['objective']
+    if solution['objective_constant'] is not None:
+        n.objective_constant = solution['objective_constant']
+    return solution['result']
+
+
+def prune_solutions(directory, max_size_gb=None, max_age_days=None):
+    """ Removes cached solutions, least recently used first.
+
+    Parameters:
+    -----------
+    directory : str
+        The cache folder.
+    max_size_gb : float, optional
+        Total size the solutions are reduced to. Default is no limit.
+    max_age_days : float, optional
+        Solutions not used for longer are removed. Default is no limit.
+
+    Returns:
+    --------
+    int
+        The number of removed solutions.
+    """
+    entries = []
+    for path in glob.glob(os.path.join(directory, 'solution-*.pkl')):
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort(reverse=True)
+
+    now = time.time()
+    total, removed = 0, 0
+    for mtime, size, path in entries:
+        total += size
+        if (max_age_days is not None and now - mtime > max_age_days * 86400) \
+                or (max_size_gb is not None and total > max_size_gb * 1e9):
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # removed by a concurrent run
+                pass
+            total -= size
+            removed += 1
+    if removed:
+        logger.info(f"Removed {removed} solution(s) from the cache")
+    return removed
+
+
+def solve_year(n, config, profile=None):
+    """ Solves the network for the current year, reusing the cached solution of
+    an identical network and settings if config['cache']['years'] is enabled.
+    Only optimal solutions are stored; afterwards the cache is pruned to
+    config['cache']['max_size_gb'] and config['cache']['max_age_days'].
+    n.solution_cached tells whether the solution was restored.
+
+    Since restored years are not solved, the cache should stay disabled when
+    timing the solves (profiling, benchmark).
+
+    Parameters:
+    -----------
+    n : Network
+        The network object to optimize.
+    config : dict
+        The model configuration (content of config.yaml).
+    profile : list, optional
+        Records of the run profile (see Model_Code.profiling).
+
+    Returns:
+    --------
+    tuple of str
+        The solver status and termination condition.
+    """
+    cache_settings = config.get('cache', {})
+    n.solution_cached = False
+    if not cache_settings.get('years', False):
+        return sv.solve_network(n, config, profile)
+
+    directory = cache_settings.get('dir', 'cache')
+    with pf.stage(profile, 'year_key', config.get('year')):
+        key = year_key(n, config)
+    with pf.stage(profile, 'solution_cache', config.get('year')):
+        result = load_solution(directory, key, n)
+    n.solution_cached = result is not None
+    if n.solution_cached:
+        logger.info(f"{config.get('year')}: solution restored from the cache ({key[:12]}), "
+                    "not solved")
+        return result
+
+    result = sv.solve_network(n, config, profile)
+    if result[0] == 'ok':
+        save_solution(directory, key, n, result)
+        prune_solutions(directory, cache_settings.get('max_size_gb'),
+                        cache_settings.get('max_age_days'))
+    return result
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+© Anas Abuzayed 2025
+
+This module writes and restores checkpoints of the myopic optimization.
+A checkpoint holds the network and all tracking tables of the yearly loop
+at the end of a year, so that a failed run can be resumed from the last
+finished year instead of starting again from 2020.
+"""
+
+import os
+import pickle
+import logging
+import pypsa
+
+logger = logging.getLogger(__name__)
+
+# Loop state stored next to the network in every checkpoint; 'last_year' is the
+# last year covered by the cost and demand trajectories and the phase-out schedule
+STATE_KEYS = ['last_year', 'ledger', 'costs', 'demand', 'saved_potential', 'Potentials_over_years',
+              'gen_bar', 'inst_bar', 'store_bar', 'ren_perc',
+              'removal_data', 'conventional_base', 'renewables', 'phase_out']
+
+
+def checkpoint_files(directory, year):
+    """ Returns the network and state file names of the checkpoint of a year.
+
+    Parameters:
+    -----------
+    directory : str
+        The checkpoint directory.
+    year : int
+        The year of the checkpoint.
+
+    Returns:
+    --------
+    tuple of str
+        Paths of the network (.nc) and the loop state (.pkl) files.
+    """
+    return (os.path.join(directory, f"{year}.nc"),
+            os.path.join(directory, f"{year}.pkl"))
+
+
+def save_checkpoint(directory, year, n, state):
+    """ Writes the checkpoint of a finished year.
+
+    Both files are first written under a temporary name and then moved in
+    place, so an interrupted write never leaves a broken checkpoint behind.
+    The state file is written last and marks the checkpoint as complete.
+
+    Parameters:
+    -----------
+    directory : str
+        The checkpoint directory.
+    year : int
+        The year that has just been optimized.
+    n : Network
+        The network object at the end of the year.
+    state : dict
+        The tracking tables of the loop, keyed by STATE_KEYS.
+
+    Returns:
+    --------
+    None
+    """
+    missing = [key for key in STATE_KEYS if key not in state]
+    if missing:
+        raise ValueError(f"Checkpoint state lacks {', '.join(missing)}")
+
+    os.makedirs(directory, exist_ok=True)
+    network_fn, state_fn = checkpoint_files(directory, year)
+
+    tmp = network_fn + '.tmp'
+    n.export_to_netcdf(tmp)
+    os.replace(tmp, network_fn)
+
+    tmp = state_fn + '.tmp'
+    with open(tmp, 'wb') as file:
+        pickle.dump({key: state[key] for key in STATE_KEYS}, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, state_fn)
+    logger.info(f"Checkpoint of year {year} written to {directory}")
+
+
+def load_checkpoint(directory, year):
+    """ Restores the network and the loop state at the end of a year.
+
+    Parameters:
+    -----------
+    directory : str
+        The checkpoint directory.
+    year : int
+        The year of the checkpoint, i.e. the last finished year.
+
+    Returns:
+    --------
+    Network
+        The restored network object.
+    dict
+        The tracking tables of the loop, with the keys in STATE_KEYS.
+    """
+    network_fn, state_fn = checkpoint_files(directory, year)
+    if not (os.path.exists(network_fn) and os.path.exists(state_fn)):
+        raise FileNotFoundError(f"No complete checkpoint of year {year} in {directory}")
+
+    n = pypsa.Network(network_fn)
+    with open(state_fn, 'rb') as file:
+        state = pickle.load(file)
+    missing = [key for key in STATE_KEYS if key not in state]
+    if missing:
+        raise ValueError(f"The checkpoint of year {year} lacks {', '.join(missing)}; "
+                         "it was written by an older version, start the run again")
+    logger.info(f"Resuming from checkpoint of year {year}")
+    return n, state
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+© Anas Abuzayed 2025
+
+This module computes the cost trajectories of the myopic optimization: the
+capital cost of every generator, storage unit, store and link and the
+marginal cost of every generator for every year, from their values in the
+base year and the cost factors (Cost_Factor.csv), fuel costs (fuel_cost.csv)
+and CO2 prices (co2_price.csv). The costs of any year are then set on the
+network in one assignment per component, without replaying the years before.
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+
+import Model_Code.roles as rl
+
+logger = logging.getLogger(__name__)
+
+# Components with capital costs following the cost factors
+CAPITAL_COMPONENTS = ['Generator', 'StorageUnit', 'Store', 'Link']
+
+# Fuels whose price is the marginal cost of their generators (instead of a change of it)
+PRICED_FUELS = ['H2']
+
+
+def _capital_costs(n, c, years, cost_factors):
+    """ Returns the capital costs of component c for the base year and years.
+
+    A technology of the cost factors applies to the generators, storage units
+    and stores of that carrier, and to the links whose role contains it
+    (e.g. 'CCGT' or 'electrolysis'). The factors of a year multiply the
+    capital costs of the year before.
+    """
+    df = n.df(c)
+    factor = np.ones((len(years), len(df)))
+    for tech in cost_factors.columns:
+        if c == 'Link':
+            names = rl.role_names(n, rl.matching_roles(tech))
+        else:
+            names = df.index[df.carrier == tech]
+        cols = df.index.get_indexer(names)
+        factor[:, cols] *= cost_factors.loc[years, tech].values[:, None]
+    growth = np.vstack([np.ones((1, len(df))), np.cumprod(factor, axis=0)])
+    return df.capital_cost.values * growth
+
+
+def _marginal_costs(n, base_year, years, fuel_cost, co2price):
+    """ Returns the marginal costs of the generators for the base year and years.
+
+    The fuel costs change the marginal cost of the generators of the fuel
+    (and of its imports) by the change of the fuel cost since the base year,
+    divided by their mean efficiency (gas costs are per MWh of gas). The
+    marginal cost of the priced fuels (H2) is the fuel cost of the year.
+    The CO2 price changes the marginal cost of emitting generators by the
+    change of the price times the specific emissions of the carrier, again
+    divided by the mean efficiency except for gas.
+    """
+    g = n.generators
+    mc = np.tile(g.marginal_cost.values, (len(years) + 1, 1))
+    priced = np.zeros(len(g), dtype=bool)
+
+    for tech in fuel_cost.columns:
+        if tech in PRICED_FUELS:
+            mask = (g.carrier == tech).values
+            mc[1:, mask] = fuel_cost.loc[years, tech].values[:, None]
+            priced |= mask
+            continue
+        mask = ((g.carrier == tech) | (g.carrier == f"imports_{tech}")).values
+        if not mask.any():
+            continue
+        eff = 1 if tech == 'gas' else g.efficiency[mask].mean()
+        delta = fuel_cost.loc[years, tech].values/eff - fuel_cost.loc[base_year, tech]/eff
+        mc[1:, mask] += delta[:, None]
+
+    price = co2price.iloc[:, 0]
+    for carrier in n.carriers.index[n.carriers.co2_emissions > 0]:
+        mask = (g.carrier == carrier).values
+        if not mask.any():
+            continue
+        scale = n.carriers.at[carrier, 'co2_emissions']
+        if carrier != 'gas':
+            scale /= g.efficiency[mask].mean()
+        # priced fuels are reset every year, so only the change of the year applies
+        since_base = price.loc[years].values - price.loc[base_year]
+        in_year = price.loc[years].values - price.loc[[y - 1 for y in years]].values
+        mc[1:, mask & ~priced] += since_base[:, None] * scale
+        mc[1:, mask & priced] += in_year[:, None] * scale
+    return mc
+
+
+def cost_trajectories(n, years, cost_factors, fuel_cost, co2price, base_year=2020):
+    """ Computes the capital and marginal costs of all components for every year.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object with the costs of the base year.
+    years : list-like of int
+        The years following the base year.
+    cost_factors : pd.DataFrame
+        Yearly factors of the capital costs by technology (data/Cost_Factor.csv).
+    fuel_cost : pd.DataFrame
+        Fuel costs by year (data/fuel_cost.csv).
+    co2price : pd.DataFrame
+        CO2 prices by year (data/co2_price.csv, see co2price_trajectory).
+    base_year : int, optional
+        The year of the costs in the network. Default is 2020.
+
+    Returns:
+    --------
+    dict
+        For every component a dict of attribute -> pd.DataFrame of the costs,
+        indexed by year (base year included) with a column per component.
+    """
+    years = list(years)
+    index = pd.Index([base_year] + years, name='year')
+    costs = {}
+    for c in CAPITAL_COMPONENTS:
+        costs[c] = {'capital_cost': pd.DataFrame(_capital_costs(n, c, years, cost_factors),
+                                                 index=index, columns=n.df(c).index)}
+    costs['Generator']['marginal_cost'] = pd.DataFrame(
+        _marginal_costs(n, base_year, years, fuel_cost, co2price),
+        index=index, columns=n.generators.index)
+    return costs
+
+
+def set_costs(n, costs, year):
+    """ Sets the costs of a year on the network.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object to update.
+    costs : dict
+        The cost trajectories, see cost_trajectories.
+    year : int
+        The year to set.
+
+    Returns:
+    --------
+    None
+    """
+    for c, attrs in costs.items():
+        df = n.df(c)
+        for attr, table in attrs.items():
+            present = table.columns.isin(df.index)
+            df.loc[table.columns[present], attr] = table.loc[year].values[present]
@@ -127,7 +127,7 @@ def Biomass_data (n,name):
             remove = pd.concat([df, remove], ignore_index=False)
 
         remove.index = remove.bus + ' ' + remove.carrier
-        remove.to_csv('{}/bio_basic_removal.csv'.format(name))
+        ut.to_csv_atomic(remove, '{}/bio_basic_removal.csv'.format(name))
 
     correct = remove.groupby(['carrier', 'bus']).agg({'p_nom': ['sum']})
     correct = correct.stack().reset_index()
@@ -176,7 +176,7 @@ def Biomass_data (n,name):
     add['bus'] = bus
     add.index = idx
     add.columns = ['p_nom', 'carrier', 'bus']
-    add.to_csv('{}/biomass_basic_addition.csv'.format(name))
+    ut.to_csv_atomic(add, '{}/biomass_basic_addition.csv'.format(name))
 
 
     return remove
@@ -363,7 +363,7 @@ def RES_data(n,name):
     add['bus']=bus
     add.index=idx
     add.columns=['p_nom','carrier','bus']
-    add.to_csv('{}/res_basic_addition.csv'.format(name))
+    ut.to_csv_atomic(add, '{}/res_basic_addition.csv'.format(name))
     
     #TODO : All in one, save time
     removal=data[['year_removed','carrier','p_nom','bus']]
@@ -381,7 +381,7 @@ def RES_data(n,name):
         remove= pd.concat([df, remove], ignore_index=False)
     
     remove.index= remove.bus + ' ' + remove.carrier
-    remove.to_csv('{}/res_basic_removal.csv'.format(name))
+    ut.to_csv_atomic(remove, '{}/res_basic_removal.csv'.format(name))
 
     return add,remove
 
@@ -535,7 +535,7 @@ def Correct_coal(n, name):
         n.remove('Generator', f'{item} {car}')
         logger.info(f"Removing {item} {car} Generator")
 
-    data.to_csv('{}/coal_basic_removal.csv'.format(name))
+    ut.to_csv_atomic(data, '{}/coal_basic_removal.csv'.format(name))
 
     return data
 
@@ -632,7 +632,7 @@ def Base_Removal_Data(n,name):
 
     data.index = data.bus + ' ' + data.carrier
 
-    data.to_csv('{}/conventional_basic_removal.csv'.format(name))
+    ut.to_csv_atomic(data, '{}/conventional_basic_removal.csv'.format(name))
 
     data_temp = data.groupby(['carrier', 'bus'], as_index=False).p_nom.sum()
     data_temp.index = data_temp.bus + ' ' + data_temp.carrier
@@ -734,7 +734,7 @@ def update_rens_profiles(n,reference_year,name):
                 data = pd.read_json(json.dumps(parsed_response['data']), orient='index')
                 resample_factor=int(8760/len(n.snapshots))
                 gen_profiles[i]=data.electricity.resample('{}H'.format(resample_factor)).mean()
-                gen_profiles.to_csv('{}/gen_profiles.csv'.format(name))
+                ut.to_csv_atomic(gen_profiles, '{}/gen_profiles.csv'.format(name))
                 time.sleep(15)
 
 
@@ -17,6 +17,13 @@ from matplotlib.offsetbox import AnchoredText
 import numpy as np
 import os
 import yaml
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import Model_Code.roles as rl
+
+logger = logging.getLogger(__name__)
 
 def pie_exp(data):
     df = pd.DataFrame({'carrier': ['gas', 'CCGT', 'OCGT', 'biomass',
@@ -32,21 +39,21 @@ def pie_exp(data):
         d.append(list(df.exp[df.carrier==data.index[i]])[0])
     return d
 
-def pie_chart(n,year,clusters,colors):
-    """ 
-    Generates a pie chart of generation shares by carrier for the specified year.
+def generation_shares(n):
+    """
+    Calculates the generation by carrier and the renewable share.
 
     Parameters:
     -----------
     n : Network
         The network object containing generator data.
-    year : int
-        The year for which the generation shares are calculated.
 
     Returns:
     --------
-    float
-        The percentage of generation from renewable sources.
+    pd.DataFrame
+        The generation by carrier with a share above 1%.
+    pd.Series
+        The share of generation from renewable sources.
     """
     
     p_by_carrier = pd.DataFrame(
@@ -60,30 +67,55 @@ def pie_chart(n,year,clusters,colors):
                            & (n.generators.carrier!= 'imports_exports_conv') 
                            & (n.generators.carrier!= 'imports_exports_res')]].columns, 
         columns=['p_by_carrier'])
-    p_by_carrier.p_by_carrier= n.generators_t.p.sum()
-    p_by_carrier.p_by_carrier*=int(8760/len(n.snapshots))
+    weightings = n.snapshot_weightings.generators
+    p_by_carrier.p_by_carrier= n.generators_t.p.multiply(weightings, axis=0).sum()
     
     new_gen=pd.DataFrame(p_by_carrier.groupby(
         n.generators.carrier).sum())
     new_gen.columns=['gens']
     
-    indices=[elem for elem in n.links.index if 'CCGT' in elem]
-    new_gen.loc['CCGT','gens']=n.links_t.p1[indices].sum().sum()*-1
-    indices=[elem for elem in n.links.index if 'OCGT' in elem]
-    new_gen.loc['OCGT','gens']=n.links_t.p1[indices].sum().sum()*-1
+    indices=rl.role_names(n, 'CCGT')
+    new_gen.loc['CCGT','gens']=n.links_t.p1[indices].multiply(weightings, axis=0).sum().sum()*-1
+    indices=rl.role_names(n, 'OCGT')
+    new_gen.loc['OCGT','gens']=n.links_t.p1[indices].multiply(weightings, axis=0).sum().sum()*-1
     
     
     new_gen.loc['H2-import','gens']=n.generators_t.p[
-        n.generators.index[n.generators.carrier=='H2']].sum().sum()
+        n.generators.index[n.generators.carrier=='H2']].multiply(weightings, axis=0).sum().sum()
 
-    indices=[elem for elem in n.links.index if 'electrolysis' in elem]
-    new_gen.loc['H2-local','gens']=n.links_t.p1[indices].sum().sum()*-1
+    indices=rl.role_names(n, 'electrolysis')
+    new_gen.loc['H2-local','gens']=n.links_t.p1[indices].multiply(weightings, axis=0).sum().sum()*-1
 
     perc=(new_gen.loc['solar']+new_gen.loc['onwind']+new_gen.loc['offwind-ac']+
           new_gen.loc['offwind-dc']+new_gen.loc['ror'])/new_gen.sum()
 
     new_gen=new_gen[(new_gen/new_gen.sum())>0.01].dropna()
-    
+    return new_gen, perc
+
+def renewable_share(n):
+    """ Returns the renewable percentage of pie_chart without drawing the chart. """
+    _, perc = generation_shares(n)
+    return round(perc*100,3)[0]
+
+def pie_chart(n,year,directory,colors):
+    """ 
+    Generates a pie chart of generation shares by carrier for the specified year.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object containing generator data.
+    year : int
+        The year for which the generation shares are calculated.
+    directory : str
+        The results folder the figure is saved in.
+
+    Returns:
+    --------
+    float
+        The percentage of generation from renewable sources.
+    """
+    new_gen, perc = generation_shares(n)
 
     colors = [colors[col] for col in new_gen.index]
     explode = pie_exp(new_gen)
@@ -93,14 +125,13 @@ def pie_chart(n,year,clusters,colors):
     patches, texts,junk = plt.pie(list(new_gen.gens),explode=explode, colors=colors,
                              autopct='%1.1f%%', shadow=True, startangle=140)
     plt.legend(patches, new_gen.index, loc="best")
-    directory = 'Results/'+str(clusters)
     plt.savefig(f'{directory}/All Generation year {year}', dpi=300, bbox_inches='tight')
     plt.show()
     
 
     return round(perc*100,3)[0]
 
-def installed_capacities(n, year, clusters,colors):
+def installed_capacities(n, year, directory,colors):
     """
     Calculates and plots the installed capacities by carrier for the specified year.
 
@@ -110,6 +141,8 @@ def installed_capacities(n, year, clusters,colors):
         The network object containing generator and link data.
     year : int
         The year for which the installed capacities are calculated.
+    directory : str
+        The results folder the figure is saved in.
 
     Returns:
     --------
@@ -132,16 +165,16 @@ def installed_capacities(n, year, clusters,colors):
     
     summation = df.groupby('carrier').sum()
     
-    indices = [elem for elem in n.links.index if 'CCGT' in elem]
+    indices=rl.role_names(n, 'CCGT')
     summation.loc['CCGT', 'p_nom'] = n.links.loc[indices, 'p_nom'].sum() * n.links.loc[indices, 'efficiency'].mean()
     
-    indices = [elem for elem in n.links.index if 'OCGT' in elem]
+    indices=rl.role_names(n, 'OCGT')
     summation.loc['OCGT', 'p_nom'] = n.links.loc[indices, 'p_nom'].sum() * n.links.loc[indices, 'efficiency'].mean()
     
-    indices = [elem for elem in n.links.index if 'electrolysis' in elem]
+    indices=rl.role_names(n, 'electrolysis')
     summation.loc['electrolysis', 'p_nom'] = n.links.loc[indices, 'p_nom'].sum() * n.links.loc[indices, 'efficiency'].mean()
     
-    indices = [elem for elem in n.links.index if 'fuel cell' in elem]
+    indices=rl.role_names(n, 'fuel cell')
     summation.loc['fuel cell', 'p_nom'] = n.links.loc[indices, 'p_nom'].sum() * n.links.loc[indices, 'efficiency'].mean()
     
     # Calculate share of renewables
@@ -163,7 +196,6 @@ def installed_capacities(n, year, clusters,colors):
                                    autopct='%1.1f%%', shadow=True, startangle=140, textprops={'color': "w"})
     plt.legend(patches, summation.index, loc="best")
 
-    directory = 'Results/'+str(clusters)
     if not os.path.exists(directory):
         os.makedirs(directory)
 
@@ -224,25 +256,26 @@ def Gen_Bar(n,bar,year):
     pd.DataFrame
         Updated DataFrame with generation values by carrier for the specified year.
         """
-    new_gen = n.generators_t.p.groupby(n.generators.carrier,axis=1).sum().sum()
+    weightings = n.snapshot_weightings.generators
+    new_gen = n.generators_t.p.multiply(weightings, axis=0).groupby(n.generators.carrier,axis=1).sum().sum()
     
     
     bar.loc[year]=abs(new_gen/1e6)
 
-    indices=[elem for elem in n.links.index if 'Gas_input' in elem]
-    bar.loc[year,'CCGT']=n.links_t.p1[indices].sum().sum()/-1e6
+    indices=rl.role_names(n, 'Gas_input')
+    bar.loc[year,'CCGT']=n.links_t.p1[indices].multiply(weightings, axis=0).sum().sum()/-1e6
 
-    indices=[elem for elem in n.links.index if 'H2_input' in elem]
-    bar.loc[year,'H2-Ready']=n.links_t.p1[indices].sum().sum()/-1e6
+    indices=rl.role_names(n, 'H2_input')
+    bar.loc[year,'H2-Ready']=n.links_t.p1[indices].multiply(weightings, axis=0).sum().sum()/-1e6
 
-    indices=[elem for elem in n.links.index if 'OCGT' in elem]
-    bar.loc[year,'OCGT']=n.links_t.p1[indices].sum().sum()/-1e6
+    indices=rl.role_names(n, 'OCGT')
+    bar.loc[year,'OCGT']=n.links_t.p1[indices].multiply(weightings, axis=0).sum().sum()/-1e6
 
-    indices=[elem for elem in n.links.index if 'electrolysis' in elem]
-    bar.loc[year,'electrolysis']=n.links_t.p1[indices].sum().sum()/-1e6
+    indices=rl.role_names(n, 'electrolysis')
+    bar.loc[year,'electrolysis']=n.links_t.p1[indices].multiply(weightings, axis=0).sum().sum()/-1e6
 
-    indices=[elem for elem in n.links.index if 'fuel cell' in elem]
-    bar.loc[year,'fuel cell']=n.links_t.p1[indices].sum().sum()/-1e6
+    indices=rl.role_names(n, 'fuel cell')
+    bar.loc[year,'fuel cell']=n.links_t.p1[indices].multiply(weightings, axis=0).sum().sum()/-1e6
 
     bar=abs(bar)
 
@@ -269,25 +302,26 @@ def Gen_Bar(n,bar,year):
     pd.DataFrame
         Updated DataFrame with generation values by carrier for the specified year.
         """
-    new_gen = n.generators_t.p.groupby(n.generators.carrier,axis=1).sum().sum()
+    weightings = n.snapshot_weightings.generators
+    new_gen = n.generators_t.p.multiply(weightings, axis=0).groupby(n.generators.carrier,axis=1).sum().sum()
     
     
     bar.loc[year]=abs(new_gen/1e6)
 
-    indices=[elem for elem in n.links.index if 'Gas_input' in elem]
-    bar.loc[year,'CCGT']=n.links_t.p1[indices].sum().sum()/-1e6
+    indices=rl.role_names(n, 'Gas_input')
+    bar.loc[year,'CCGT']=n.links_t.p1[indices].multiply(weightings, axis=0).sum().sum()/-1e6
 
-    indices=[elem for elem in n.links.index if 'H2_input' in elem]
-    bar.loc[year,'H2-Ready']=n.links_t.p1[indices].sum().sum()/-1e6
+    indices=rl.role_names(n, 'H2_input')
+    bar.loc[year,'H2-Ready']=n.links_t.p1[indices].multiply(weightings, axis=0).sum().sum()/-1e6
 
-    indices=[elem for elem in n.links.index if 'OCGT' in elem]
-    bar.loc[year,'OCGT']=n.links_t.p1[indices].sum().sum()/-1e6
+    indices=rl.role_names(n, 'OCGT')
+    bar.loc[year,'OCGT']=n.links_t.p1[indices].multiply(weightings, axis=0).sum().sum()/-1e6
 
-    indices=[elem for elem in n.links.index if 'electrolysis' in elem]
-    bar.loc[year,'electrolysis']=n.links_t.p1[indices].sum().sum()/-1e6
+    indices=rl.role_names(n, 'electrolysis')
+    bar.loc[year,'electrolysis']=n.links_t.p1[indices].multiply(weightings, axis=0).sum().sum()/-1e6
 
-    indices=[elem for elem in n.links.index if 'fuel cell' in elem]
-    bar.loc[year,'fuel cell']=n.links_t.p1[indices].sum().sum()/-1e6
+    indices=rl.role_names(n, 'fuel cell')
+    bar.loc[year,'fuel cell']=n.links_t.p1[indices].multiply(weightings, axis=0).sum().sum()/-1e6
 
     bar=abs(bar)
 
@@ -304,19 +338,19 @@ def Inst_Bar(n,bar,year):
     bar=bar.sort_index(axis=0,ascending=True)
     
     
-    indices=[elem for elem in n.links.index if 'CCGT' in elem]
+    indices=rl.role_names(n, 'CCGT')
     bar.loc[year,'CCGT']=n.links.loc[indices,'p_nom'].sum() * n.links.loc[indices,'efficiency'].mean()/1e3
 
-    indices=[elem for elem in n.links.index if 'OCGT' in elem]
+    indices=rl.role_names(n, 'OCGT')
     bar.loc[year,'OCGT']=n.links.loc[indices,'p_nom'].sum() * n.links.loc[indices,'efficiency'].mean()/1e3
 
-    indices=[elem for elem in n.links.index if 'H2_input' in elem]
+    indices=rl.role_names(n, 'H2_input')
     bar.loc[year,'H2-Ready']=n.links.loc[indices,'p_nom'].sum() * n.links.loc[indices,'efficiency'].mean()/1e3
 
-    indices=[elem for elem in n.links.index if 'electrolysis' in elem]
+    indices=rl.role_names(n, 'electrolysis')
     bar.loc[year,'electrolysis']=n.links.loc[indices,'p_nom'].sum() * n.links.loc[indices,'efficiency'].mean()/1e3
 
-    indices=[elem for elem in n.links.index if 'fuel cell' in elem]
+    indices=rl.role_names(n, 'fuel cell')
     bar.loc[year,'fuel cell']=n.links.loc[indices,'p_nom'].sum() * n.links.loc[indices,'efficiency'].mean()/1e3
 
     return bar
@@ -375,7 +409,7 @@ def Storage_Bar (bar,name,colors):
     bar.to_csv('{}/Storage_Bar.csv'.format(name))
 
 
-def Country_Map(n,year,config,clusters):
+def Country_Map(n,year,config,directory):
     opts = config['plotting']
     map_figsize = [10,10]#opts['map']['figsize']
     map_boundaries = opts['map']['boundaries']
@@ -392,8 +426,7 @@ def Country_Map(n,year,config,clusters):
                                   (n.generators.carrier == 'imports_exports_conv')|
                                   (n.generators.carrier == 'imports_exports_res')],inplace=True)
     
-    indices=[elem for elem in n.links.index if 'CCGT' in elem]
-    indices.extend([elem for elem in n.links.index if 'OCGT' in elem])
+    indices=rl.role_names(n, ['CCGT','OCGT'])
     links_c=n.links.loc[
         indices,['bus1','p_nom','efficiency','carrier']].copy()
     
@@ -437,6 +470,130 @@ def Country_Map(n,year,config,clusters):
     ax.add_artist(AnchoredText("{}".format(year), loc=2))
     ax.set_aspect('equal')
     ax.axis('off')
-    directory = 'Results/'+str(clusters)
     plt.savefig(f'{directory}/Installation Map {year}', bbox_inches='tight')
     plt.show()
+
+
+def plot_year(n, year, directory, config):
+    """
+    Draws the yearly figures: installed capacities, installation map and
+    generation shares.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object at the end of the year.
+    year : int
+        The year shown in the figures.
+    directory : str
+        The results folder the figures are saved in.
+    config : dict
+        The configuration, providing the plotting settings.
+
+    Returns:
+    --------
+    float
+        The percentage of generation from renewable sources.
+    """
+    colors = config['plotting']['tech_colors']
+    installed_capacities(n, year=year, directory=directory, colors=colors)
+    Country_Map(n, year=year, config=config, directory=directory)
+    return pie_chart(n, year, directory=directory, colors=colors)
+
+
+def render_year(path, year, directory, config):
+    """
+    Draws the yearly figures from a stored network, e.g. in a background
+    process or after the run.
+
+    Parameters:
+    -----------
+    path : str
+        The network file of the year, as exported by the myopic loop.
+    year : int
+        The year shown in the figures.
+    directory : str
+        The results folder the figures are saved in.
+    config : dict
+        The configuration, providing the plotting settings.
+
+    Returns:
+    --------
+    None
+    """
+    plt.switch_backend('Agg')
+    n = pypsa.Network(path)
+    plot_year(n, year, directory, config)
+    plt.close('all')
+
+
+def start_renderer():
+    """
+    Starts a background process that draws the yearly figures while the
+    myopic loop continues.
+
+    Returns:
+    --------
+    ProcessPoolExecutor
+        The renderer; years are submitted with render_year.
+    """
+    return ProcessPoolExecutor(max_workers=1,
+                               mp_context=multiprocessing.get_context('spawn'))
+
+
+def stop_renderer(renderer, renders):
+    """
+    Waits for the background renderer to draw all submitted years.
+
+    Parameters:
+    -----------
+    renderer : ProcessPoolExecutor
+        The renderer returned by start_renderer.
+    renders : dict
+        The submitted jobs, mapping the year to its future.
+
+    Returns:
+    --------
+    None
+    """
+    renderer.shutdown(wait=True)
+    for year, future in renders.items():
+        if future.exception() is not None:
+            logger.warning(f"Figures of year {year} failed: {future.exception()!r}")
+
+
+def render_results(directory, config, years=None):
+    """
+    Draws the yearly figures of a finished run from its stored networks.
+
+    Parameters:
+    -----------
+    directory : str
+        The results folder of the run, holding the '<year>.nc' files.
+    config : dict
+        The configuration, providing the plotting settings.
+    years : iterable of int, optional
+        The years to draw. Default is every year with a network file.
+
+    Returns:
+    --------
+    None
+    """
+    if years is None:
+        years = sorted(int(os.path.basename(path)[:-3])
+                       for path in glob.glob(f"{directory}/*.nc")
+                       if os.path.basename(path)[:-3].isdigit())
+    for year in years:
+        path = f"{directory}/{year}.nc"
+        if not os.path.exists(path):
+            logger.warning(f"No network of year {year} in {directory}")
+            continue
+        render_year(path, year, directory, config)
+
+
+if __name__ == "__main__":
+    # Post-run rendering: python -m Model_Code.plotting Results/4 [config.yaml]
+    import sys
+    with open(sys.argv[2] if len(sys.argv) > 2 else 'config.yaml', "r") as file:
+        config = yaml.load(file, Loader=yaml.FullLoader)
+    render_results(sys.argv[1], config)
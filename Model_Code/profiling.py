@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+© Anas Abuzayed 2025
+
+This module measures the stages of the myopic optimization. For every stage
+(e.g. a yearly update function, the LOPF build, solve and read phases, the
+plotting or the export) it records the wall time, the CPU time (including
+solver subprocesses) and the peak memory of the process. The records are
+written to profile.csv/profile.json in the results folder and summarised at
+the end of the run.
+"""
+
+import os
+import json
+import time
+import logging
+import functools
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def _cpu_time():
+    """Returns the CPU time of the process and its children in seconds."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _reset_peak_rss():
+    """Resets the peak memory of the process, where the OS supports it (Linux)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _rss():
+    """Returns the current and the peak memory of the process in MB."""
+    try:
+        with open('/proc/self/status') as file:
+            status = dict(line.split(':', 1) for line in file if ':' in line)
+        return int(status['VmRSS'].split()[0]) / 1024, int(status['VmHWM'].split()[0]) / 1024
+    except (OSError, KeyError):
+        if resource is None:
+            return float('nan'), float('nan')
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return float('nan'), peak
+
+
+@contextmanager
+def stage(records, name, year=None):
+    """ Measures a stage of the model run.
+
+    Stages should not be nested, since the peak memory is reset at the
+    start of every stage.
+
+    Parameters:
+    -----------
+    records : list or None
+        The list the measurement is appended to. If None, nothing is
+        measured, so stages can stay in place when profiling is disabled.
+    name : str
+        The name of the stage, e.g. 'update_const_gens'.
+    year : int, optional
+        The year of the myopic loop.
+
+    Returns:
+    --------
+    None
+    """
+    if records is None:
+        yield
+        return
+    reset = _reset_peak_rss()
+    wall, cpu = time.perf_counter(), _cpu_time()
+    try:
+        yield
+    finally:
+        rss, peak = _rss()
+        records.append({'year': year, 'stage': name,
+                        'wall_s': time.perf_counter() - wall,
+                        'cpu_s': _cpu_time() - cpu,
+                        'peak_rss_mb': peak if reset else float('nan'),
+                        'rss_mb': rss})
+
+
+@contextmanager
+def patched_stages(records, year, targets):
+    """ Measures library functions called inside a block as separate stages.
+
+    Parameters:
+    -----------
+    records : list or None
+        See stage.
+    year : int
+        The year of the myopic loop.
+    targets : list of tuple
+        (owner, attribute, stage name): the function owner.attribute is
+        replaced by a measured version for the duration of the block.
+
+    Returns:
+    --------
+    None
+    """
+    if records is None:
+        yield
+        return
+
+    def measured(func, name):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(records, name, year):
+                return func(*args, **kwargs)
+        return wrapper
+
+    originals = [(owner, attr, getattr(owner, attr), name) for owner, attr, name in targets
+                 if hasattr(owner, attr)]
+    try:
+        for owner, attr, func, name in originals:
+            setattr(owner, attr, measured(func, name))
+        yield
+    finally:
+        for owner, attr, func, _ in originals:
+            setattr(owner, attr, func)
+
+
+def lopf_phases(records, year, solver_name, backend='lopf'):
+    """ Measures the build, solve and read phases of a network optimization.
+
+    Parameters:
+    -----------
+    records : list or None
+        See stage.
+    year : int
+        The year of the myopic loop.
+    solver_name : str
+        The solver of the legacy LOPF (its run_and_read function is measured).
+    backend : str, optional
+        'lopf' for the legacy LOPF (default), 'optimize' for n.optimize or
+        'persistent' for the persistent linopy model, whose build phase is
+        measured by the caller.
+
+    Returns:
+    --------
+    contextmanager
+    """
+    if records is None:
+        return patched_stages(None, year, [])
+    if backend in ['optimize', 'persistent']:
+        import linopy
+        import pypsa.optimization.optimize as optimize
+        targets = [(linopy.Model, 'solve', 'lopf_solve'),
+                   (optimize, 'assign_solution', 'lopf_read'),
+                   (optimize, 'assign_duals', 'lopf_read'),
+                   (optimize, 'post_processing', 'lopf_read')]
+        if backend == 'optimize':
+            targets.append((optimize, 'create_model', 'lopf_build'))
+    else:
+        import pypsa.linopf as linopf
+        targets = [(linopf, 'prepare_lopf', 'lopf_build'),
+                   (linopf, f'run_and_read_{solver_name}', 'lopf_solve'),
+                   (linopf, 'assign_solution', 'lopf_read')]
+    return patched_stages(records, year, targets)
+
+
+def save_profile(records, directory):
+    """ Writes the measurements to profile.csv and profile.json.
+
+    Parameters:
+    -----------
+    records : list
+        The measurements of the run.
+    directory : str
+        The results folder.
+
+    Returns:
+    --------
+    pd.DataFrame
+        The measurements as a table.
+    """
+    profile = pd.DataFrame(records, columns=['year', 'stage', 'wall_s', 'cpu_s',
+                                             'peak_rss_mb', 'rss_mb'])
+    profile.to_csv(f"{directory}/profile.csv", index=False)
+    with open(f"{directory}/profile.json", 'w') as file:
+        json.dump(json.loads(profile.to_json(orient='records')), file, indent=1)
+    return profile
+
+
+def summary(records):
+    """ Summarises the measurements per stage over all years.
+
+    Parameters:
+    -----------
+    records : list
+        The measurements of the run.
+
+    Returns:
+    --------
+    pd.DataFrame
+        Total and mean wall time, total CPU time, maximum peak memory and the
+        share of the total wall time of every stage, largest first.
+    """
+    profile = pd.DataFrame(records)
+    table = profile.groupby('stage').agg(calls=('wall_s', 'size'),
+                                         wall_s=('wall_s', 'sum'),
+                                         mean_wall_s=('wall_s', 'mean'),
+                                         cpu_s=('cpu_s', 'sum'),
+                                         peak_rss_mb=('peak_rss_mb', 'max'))
+    table['wall_share'] = table.wall_s / table.wall_s.sum()
+    return table.sort_values('wall_s', ascending=False)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+© Anas Abuzayed 2025
+
+This module keeps the role index of the network: for every AC bus the names
+of its CCGT, OCGT, Gas_input, H2_input, electrolysis and fuel cell links and
+of its H2 store, and for every extendable generator and storage unit the
+name of its 'Fixed' twin. The index is built once after the network has been
+converted to the myopic baseline (convert_opt_to_conv and H2_ready) and kept
+on the network as n.roles; it is updated when components are added or
+removed, so that the yearly functions look components up instead of
+scanning all names for substrings.
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Roles at every AC bus: role -> (component, name suffix of '<bus> <suffix>')
+ROLES = {'CCGT': ('Link', 'CCGT'),
+         'OCGT': ('Link', 'OCGT'),
+         'Gas_input': ('Link', 'Gas_input'),
+         'H2_input': ('Link', 'H2_input'),
+         'electrolysis': ('Link', 'electrolysis'),
+         'fuel cell': ('Link', 'fuel cell'),
+         'H2 store': ('Store', 'H2')}
+
+# Components with 'Fixed' twins holding the capacity built in previous years
+TWIN_COMPONENTS = ['Generator', 'StorageUnit']
+
+
+def _twins(names, index):
+    """ Returns the 'Fixed' names among names whose extendable twin is in index,
+    mapped to the name of the twin. """
+    names = pd.Index(names, dtype=object)  # empty tables may have a RangeIndex
+    fixed = names[names.str.startswith('Fixed ')]
+    fixed = fixed[fixed.str[6:].isin(index)]
+    return pd.Series(fixed.str[6:], index=fixed, dtype=object)
+
+
+def build_roles(n):
+    """ Builds the role index of the network and stores it as n.roles.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object, after convert_opt_to_conv and H2_ready.
+
+    Returns:
+    --------
+    dict
+        'buses': pd.DataFrame indexed by AC bus with a column per role holding
+        the component name (NaN where the bus has no such component).
+        'fixed': dict of pd.Series per component in TWIN_COMPONENTS, mapping
+        the 'Fixed' names to the names of their extendable twins.
+    """
+    buses = n.buses.index[n.buses.carrier == 'AC']
+    table = pd.DataFrame(index=buses, columns=list(ROLES), dtype=object)
+    for role, (component, suffix) in ROLES.items():
+        names = buses + ' ' + suffix
+        table[role] = np.where(names.isin(n.df(component).index), names, np.nan)
+
+    n.roles = {'buses': table,
+               'fixed': {c: _twins(n.df(c).index, n.df(c).index) for c in TWIN_COMPONENTS}}
+    return n.roles
+
+
+def get_roles(n):
+    """ Returns the role index of the network, building it if the network has none
+    (e.g. a network read from a results file).
+
+    Parameters:
+    -----------
+    n : Network
+        The network object.
+
+    Returns:
+    --------
+    dict
+        The role index, see build_roles.
+    """
+    roles = getattr(n, 'roles', None)
+    if roles is None:
+        roles = build_roles(n)
+    return roles
+
+
+def role_names(n, roles):
+    """ Returns the names of the components with the given roles.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object.
+    roles : str or list of str
+        One or several roles of ROLES, e.g. 'electrolysis'.
+
+    Returns:
+    --------
+    pd.Index
+        The component names, role by role in the order of the buses.
+    """
+    table = get_roles(n)['buses']
+    if isinstance(roles, str):
+        roles = [roles]
+    names = [table[role].dropna().values for role in roles]
+    return pd.Index(np.concatenate(names) if names else [], dtype=object)
+
+
+def matching_roles(text, component='Link'):
+    """ Returns the roles of a component whose names contain text, e.g. the
+    link roles 'Gas_input' and 'H2_input' for 'input'.
+
+    Parameters:
+    -----------
+    text : str
+        Part of the name suffix, e.g. a technology of the cost factors.
+    component : str, optional
+        The component type. Default is 'Link'.
+
+    Returns:
+    --------
+    list of str
+        The matching roles of ROLES.
+    """
+    return [role for role, (c, suffix) in ROLES.items() if c == component and text in suffix]
+
+
+def role_at(n, role, buses):
+    """ Returns the names of the components with a role at the given buses.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object.
+    role : str
+        A role of ROLES.
+    buses : list-like
+        AC bus names.
+
+    Returns:
+    --------
+    pd.Series
+        The component names (NaN where a bus has none), indexed by bus.
+    """
+    return get_roles(n)['buses'][role].reindex(buses)
+
+
+def fixed_twins(n, component):
+    """ Maps the 'Fixed' components to the extendable components they collect.
+
+    Every extendable component 'X' has a non-extendable twin 'Fixed X' that
+    holds the capacity built in the previous years.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object.
+    component : str
+        'Generator' or 'StorageUnit'.
+
+    Returns:
+    --------
+    pd.Series
+        The name of the extendable twin, indexed by the 'Fixed' name.
+    """
+    return get_roles(n)['fixed'][component]
+
+
+def add_components(n, component, names):
+    """ Updates the role index after components have been added to the network.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object.
+    component : str
+        The component type, e.g. 'Link'.
+    names : list-like
+        The names of the added components.
+
+    Returns:
+    --------
+    None
+    """
+    roles = getattr(n, 'roles', None)
+    if roles is None:
+        return
+    names = pd.Index(names)
+    table = roles['buses']
+    for role, (c, suffix) in ROLES.items():
+        if c != component:
+            continue
+        named = names[names.str.endswith(' ' + suffix)]
+        buses = named.str[:-len(suffix) - 1]
+        at_bus = buses.isin(table.index)
+        table.loc[buses[at_bus], role] = named[at_bus].values
+
+    if component in TWIN_COMPONENTS:
+        # added 'Fixed' components and added extendable components with a 'Fixed' twin
+        index = n.df(component).index
+        candidates = names.append('Fixed ' + names[~names.str.startswith('Fixed ')])
+        new = _twins(candidates[candidates.isin(index)], index)
+        fixed = roles['fixed'][component]
+        roles['fixed'][component] = pd.concat([fixed, new[~new.index.isin(fixed.index)]])
+
+
+def remove_components(n, component, names):
+    """ Updates the role index after components have been removed from the network.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object.
+    component : str
+        The component type, e.g. 'Generator'.
+    names : list-like
+        The names of the removed components.
+
+    Returns:
+    --------
+    None
+    """
+    roles = getattr(n, 'roles', None)
+    if roles is None:
+        return
+    names = pd.Index(names)
+    table = roles['buses']
+    for role, (c, _) in ROLES.items():
+        if c == component:
+            table.loc[table[role].isin(names), role] = np.nan
+
+    if component in TWIN_COMPONENTS:
+        fixed = roles['fixed'][component]
+        roles['fixed'][component] = fixed[~(fixed.index.isin(names) | fixed.isin(names))]
@@ -0,0 +1,471 @@
+# -*- coding: utf-8 -*-
+"""
+© Anas Abuzayed 2025
+
+This module wraps the solver call of the myopic loop, so that every year of
+the optimization is solved with the same options read from the config file.
+It also keeps the solver basis of the previous year, which can be used to
+warm-start the next year's LP.
+
+The network is either solved with the legacy LOPF (backend 'lopf', which
+writes the LP to a file) or with the linopy-based n.optimize (backend
+'optimize', which builds the model in memory). With 'persistent' enabled, the
+linopy model is built once and only updated in place between the years
+(bounds, costs, loads, CO2 limit), instead of rebuilding the whole model for
+every year.
+"""
+
+import os
+import hashlib
+import logging
+import tempfile
+import numpy as np
+import pandas as pd
+from xarray import DataArray
+
+from Model_Code.Constraints import extra_functionality, extra_functionality_linopy
+import Model_Code.profiling as pf
+
+logger = logging.getLogger(__name__)
+
+# Attributes that define the structure (variables, coefficients) of the model.
+# If any of them changes between two years, the persistent model is rebuilt.
+STRUCTURE_ATTRS = {
+    'Generator': ['bus', 'carrier', 'efficiency', 'p_nom_extendable', 'committable', 'sign'],
+    'Link': ['bus0', 'bus1', 'carrier', 'efficiency', 'p_nom_extendable', 'committable'],
+    'StorageUnit': ['bus', 'carrier', 'p_nom_extendable', 'cyclic_state_of_charge',
+                    'max_hours', 'efficiency_store', 'efficiency_dispatch', 'standing_loss'],
+    'Store': ['bus', 'carrier', 'e_nom_extendable', 'e_cyclic', 'standing_loss'],
+    'Line': ['bus0', 'bus1', 's_nom_extendable', 'x', 'r'],
+    'Transformer': ['bus0', 'bus1', 's_nom_extendable', 'x', 'r'],
+    'Load': ['bus', 'sign'],
+    'GlobalConstraint': ['type', 'carrier_attribute', 'sense'],
+    'Carrier': ['co2_emissions'],
+}
+
+
+def solver_settings(config):
+    """ Splits the solver section of the config into solver name and options.
+
+    If the solver section names a 'profile', the options of that entry of
+    config['solving']['solver_profiles'] are used, updated by the other
+    options of the solver section (e.g. the threads set by a sweep).
+
+    Parameters:
+    -----------
+    config : dict
+        The model configuration (content of config.yaml).
+
+    Returns:
+    --------
+    str
+        The solver name (e.g. 'gurobi').
+    dict
+        The solver options passed directly to the solver.
+    """
+    solver_options = config['solving']['solver'].copy()
+    profile = solver_options.pop('profile', None)
+    if profile is not None:
+        profiles = config['solving'].get('solver_profiles', {})
+        if profile not in profiles:
+            raise KeyError(f"Solver profile '{profile}' not in solving.solver_profiles "
+                           f"({', '.join(profiles)})")
+        solver_options = {**profiles[profile], **solver_options}
+    solver_name = solver_options.pop('name')
+    return solver_name, solver_options
+
+
+def has_basis(n):
+    """ Checks whether the network holds a usable basis from a previous solve.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object.
+
+    Returns:
+    --------
+    bool
+        True if a basis file of the last solve exists on disk.
+    """
+    basis_fn = getattr(n, 'basis_fn', None)
+    return basis_fn is not None and os.path.exists(basis_fn)
+
+
+def solve_network(n, config, profile=None):
+    """ Solves the network for the current year of the myopic optimization.
+
+    If 'warmstart' is enabled in config['solving']['options'], the basis of
+    every solve is stored and the following solve starts from it. Consecutive
+    years only differ in a few bounds, costs and the CO2 limit, hence the
+    previous optimum is a good starting point. Note that a basis is only
+    available if the solver runs simplex or barrier with crossover.
+
+    The backend is chosen by 'backend' in config['solving']['options']:
+    'lopf' (default) solves with the legacy LOPF, 'optimize' with n.optimize
+    (see solve_optimize). If 'persistent' is enabled, the year is solved with
+    the persistent linopy model (see solve_persistent).
+
+    Parameters:
+    -----------
+    n : Network
+        The network object to optimize.
+    config : dict
+        The model configuration (content of config.yaml).
+    profile : list, optional
+        Records of the run profile; the build, solve and read phases are
+        appended to it (see Model_Code.profiling).
+
+    Returns:
+    --------
+    tuple of str
+        The solver status and termination condition.
+    """
+    solver_name, solver_options = solver_settings(config)
+    options = config['solving'].get('options', {})
+    tmpdir = config['solving'].get('tmpdir')
+
+    if options.get('persistent', False):
+        return solve_persistent(n, config, profile)
+    if options.get('backend', 'lopf') == 'optimize':
+        return solve_optimize(n, config, profile)
+
+    warmstart = options.get('warmstart', False)
+    use_basis = warmstart and has_basis(n)
+    if warmstart and not use_basis:
+        logger.info("No basis from a previous solve available, solving from scratch")
+
+    with pf.lopf_phases(profile, config.get('year'), solver_name):
+        status, condition = n.lopf(solver_name=solver_name,
+                                   solver_options=solver_options,
+                                   extra_functionality=extra_functionality,
+                                   solver_dir=tmpdir,
+                                   warmstart=use_basis,
+                                   store_basis=warmstart)
+
+    if warmstart and not has_basis(n):
+        logger.warning("Solver did not return a basis, the next year cannot be "
+                       "warm-started. Use simplex or barrier with crossover.")
+    return status, condition
+
+
+def _linopy_basis_kwargs(n, options, tmpdir):
+    """Returns the basis files of a linopy solve if 'warmstart' is enabled."""
+    kwargs = {}
+    if options.get('warmstart', False):
+        if has_basis(n):
+            kwargs['warmstart_fn'] = n.basis_fn
+        n.basis_fn = os.path.join(tmpdir, f"pypsa-basis-{os.getpid()}-{id(n)}.bas")
+        kwargs['basis_fn'] = n.basis_fn
+    return kwargs
+
+
+def solve_optimize(n, config, profile=None):
+    """ Solves the network with the linopy-based n.optimize.
+
+    The model is built in memory from arrays and passed to the solver through
+    the linopy interface given by 'io_api' (e.g. 'direct', without an LP file).
+    The supplementary constraints are those of extra_functionality_linopy.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object to optimize.
+    config : dict
+        The model configuration (content of config.yaml).
+    profile : list, optional
+        Records of the run profile (see solve_network).
+
+    Returns:
+    --------
+    tuple of str
+        The solver status and termination condition.
+    """
+    solver_name, solver_options = solver_settings(config)
+    options = config['solving'].get('options', {})
+    tmpdir = config['solving'].get('tmpdir') or tempfile.gettempdir()
+
+    kwargs = _linopy_basis_kwargs(n, options, tmpdir)
+    with pf.lopf_phases(profile, config.get('year'), solver_name, backend='optimize'):
+        return n.optimize(solver_name=solver_name,
+                          solver_options=solver_options,
+                          extra_functionality=extra_functionality_linopy,
+                          io_api=options.get('io_api'),
+                          **kwargs)
+
+
+def compare_backends(n, config, rtol=1e-5):
+    """ Solves copies of the network with the 'lopf' and the 'optimize' backend
+    and compares the results.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object, left unchanged.
+    config : dict
+        The model configuration (content of config.yaml).
+    rtol : float, optional
+        The relative tolerance of the comparison. Default is 1e-5.
+
+    Returns:
+    --------
+    pd.DataFrame
+        The objective and the total optimal capacity of every component type
+        of both backends, their relative difference and whether it is within
+        rtol.
+    """
+    results = {}
+    for backend in ['lopf', 'optimize']:
+        m = n.copy()
+        m.opts, m.config = n.opts, n.config
+        backend_config = {**config, 'solving': {**config['solving'],
+                          'options': {**config['solving'].get('options', {}),
+                                      'backend': backend, 'persistent': False,
+                                      'warmstart': False}}}
+        solve_network(m, backend_config)
+        values = {'objective': m.objective}
+        for c, attr in [('Generator', 'p_nom_opt'), ('StorageUnit', 'p_nom_opt'),
+                        ('Store', 'e_nom_opt'), ('Link', 'p_nom_opt'), ('Line', 's_nom_opt')]:
+            values[f"{c} {attr}"] = m.df(c)[attr].sum()
+        results[backend] = pd.Series(values)
+
+    parity = pd.DataFrame(results)
+    parity['rel_diff'] = ((parity['optimize'] - parity['lopf']).abs()
+                          / parity['lopf'].abs().clip(lower=1e-9))
+    parity['match'] = parity.rel_diff <= rtol
+    if not parity.match.all():
+        logger.warning("The backends differ in: " + ", ".join(parity.index[~parity.match]))
+    return parity
+
+
+def _hash_frame(df):
+    """Returns a hash of the content of a DataFrame, including its index."""
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=True).values.tobytes()).hexdigest()
+
+
+def structure_key(n):
+    """ Computes a key describing the structure of the optimization model of n.
+
+    The key covers the components, their extendability and all attributes that
+    enter the model as coefficients. Values that only enter the model as bounds,
+    right-hand sides or costs (p_nom, p_nom_max, marginal_cost, loads, ...) are
+    not part of it, since those are updated in place by update_persistent_model.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object.
+
+    Returns:
+    --------
+    str
+        A hash of the model structure.
+    """
+    from pypsa.descriptors import nominal_attrs
+
+    key = hashlib.sha1()
+    key.update(str(list(n.snapshots)).encode())
+    key.update(_hash_frame(n.snapshot_weightings).encode())
+    for c, attrs in STRUCTURE_ATTRS.items():
+        df = n.df(c)
+        key.update(_hash_frame(df[df.columns.intersection(attrs)]).encode())
+        if c not in nominal_attrs:
+            continue
+        nom = nominal_attrs[c]
+        ext_i = n.get_extendable_i(c)
+        pu = df.columns.intersection([nom.replace('nom', 'max_pu'),
+                                      nom.replace('nom', 'min_pu')])
+        key.update(_hash_frame(df.loc[ext_i, pu]).encode())
+        key.update(_hash_frame(np.isinf(df.loc[ext_i, [nom + '_max']])).encode())
+        pnl = n.pnl(c)
+        for attr in pu:
+            if attr in pnl:
+                key.update(_hash_frame(pnl[attr][pnl[attr].columns.intersection(ext_i)]).encode())
+    return key.hexdigest()
+
+
+def build_persistent_model(n):
+    """ Builds the linopy model of the network once and stores it in n.model.
+
+    The supplementary constraints are added afterwards. Their names are kept in
+    n.model_extra_constraints, so they can be renewed on every update.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object to build the model for.
+
+    Returns:
+    --------
+    None
+    """
+    logger.info("Building persistent model")
+    n.optimize.create_model()
+    constraints = set(n.model.constraints)
+    extra_functionality_linopy(n, n.snapshots)
+    n.model_extra_constraints = set(n.model.constraints) - constraints
+    n.model_structure = structure_key(n)
+
+
+def _set_rhs(m, name, rhs):
+    """Sets the right-hand side of constraint 'name' if it exists in the model."""
+    if name in m.constraints:
+        m.constraints[name].rhs = rhs
+
+
+def _update_nominal_bounds(n, c, attr):
+    """Updates the capacity bounds of the extendable assets of component c."""
+    ext_i = n.get_extendable_i(c)
+    if ext_i.empty:
+        return
+    m = n.model
+    lower = n.df(c)[attr + '_min'].reindex(ext_i)
+    upper = n.df(c)[attr + '_max'].reindex(ext_i)
+    _set_rhs(m, f"{c}-ext-{attr}-lower", DataArray(lower))
+    _set_rhs(m, f"{c}-ext-{attr}-upper", DataArray(upper))
+
+
+def _update_fixed_dispatch(n, sns, c, attr):
+    """Updates the dispatch limits of the non-extendable assets of component c."""
+    from pypsa.descriptors import get_bounds_pu, nominal_attrs
+
+    fix_i = n.get_non_extendable_i(c)
+    fix_i = fix_i.difference(n.get_committable_i(c)).rename(fix_i.name)
+    if fix_i.empty:
+        return
+    nominal_fix = n.df(c)[nominal_attrs[c]].reindex(fix_i)
+    min_pu, max_pu = get_bounds_pu(n, c, sns, fix_i, attr)
+    lower = min_pu.mul(nominal_fix).rename_axis(index='snapshot', columns=fix_i.name)
+    upper = max_pu.mul(nominal_fix).rename_axis(index='snapshot', columns=fix_i.name)
+    _set_rhs(n.model, f"{c}-fix-{attr}-lower", DataArray(lower))
+    _set_rhs(n.model, f"{c}-fix-{attr}-upper", DataArray(upper))
+
+
+def _update_nodal_balance(n, sns):
+    """Updates the loads on the right-hand side of the nodal balances."""
+    from pypsa.descriptors import get_switchable_as_dense
+
+    m = n.model
+    rhs = (-get_switchable_as_dense(n, 'Load', 'p_set', sns) * n.loads.sign)\
+        .T.groupby(n.loads.bus).sum().T
+    for name in [name for name in m.constraints if name.endswith('nodal_balance')]:
+        dim = [d for d in m.constraints[name].rhs.dims if d != 'snapshot'][0]
+        buses = m.constraints[name].rhs.indexes[dim]
+        values = rhs.reindex(columns=buses, fill_value=0)
+        m.constraints[name].rhs = DataArray(values.rename_axis(index='snapshot', columns=dim))
+
+
+def _update_energy_balances(n, sns):
+    """Updates inflows and initial states of storage units and stores."""
+    from pypsa.descriptors import get_switchable_as_dense
+
+    m = n.model
+    sus = n.storage_units
+    if not sus.empty:
+        eh = n.snapshot_weightings.stores[sns]
+        rhs = -get_switchable_as_dense(n, 'StorageUnit', 'inflow', sns).mul(eh, axis=0)
+        noncyclic = ~sus.cyclic_state_of_charge
+        rhs.iloc[0] -= sus.state_of_charge_initial.where(noncyclic, 0)
+        _set_rhs(m, 'StorageUnit-energy_balance',
+                 DataArray(rhs.rename_axis(index='snapshot', columns='StorageUnit')))
+    stores = n.stores
+    if not stores.empty:
+        rhs = pd.DataFrame(0., index=sns, columns=stores.index)
+        rhs.iloc[0] = -stores.e_initial.where(~stores.e_cyclic, 0)
+        _set_rhs(m, 'Store-energy_balance',
+                 DataArray(rhs.rename_axis(index='snapshot', columns='Store')))
+
+
+def _update_global_constraints(n):
+    """Updates the right-hand side of the primary energy (CO2) limits."""
+    emissions = n.carriers.co2_emissions
+    for name, glc in n.global_constraints.query('type == "primary_energy"').iterrows():
+        rhs = glc.constant
+        sus = n.storage_units[~n.storage_units.cyclic_state_of_charge]
+        rhs -= sus.carrier.map(emissions).fillna(0) @ sus.state_of_charge_initial
+        stores = n.stores[~n.stores.e_cyclic]
+        rhs -= stores.carrier.map(emissions).fillna(0) @ stores.e_initial
+        _set_rhs(n.model, f"GlobalConstraint-{name}", rhs)
+
+
+def update_persistent_model(n):
+    """ Applies the changes of the network since the last solve to n.model.
+
+    Capacity bounds, dispatch limits of fixed assets, loads, initial storage
+    levels, the CO2 limit and the objective (capital and marginal costs) are
+    written into the existing model. The supplementary constraints are removed
+    and added again, since they depend on the installed capacities.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object holding a persistent model in n.model.
+
+    Returns:
+    --------
+    None
+    """
+    from pypsa.descriptors import nominal_attrs
+    from pypsa.optimization.optimize import define_objective, lookup
+
+    m = n.model
+    sns = n.snapshots
+
+    for c, attr in nominal_attrs.items():
+        _update_nominal_bounds(n, c, attr)
+    for c, attr in lookup.query("not nominal and not handle_separately").index:
+        _update_fixed_dispatch(n, sns, c, attr)
+    _update_nodal_balance(n, sns)
+    _update_energy_balances(n, sns)
+    _update_global_constraints(n)
+
+    if 'objective_constant' in m.variables:
+        m.remove_variables('objective_constant')
+    define_objective(n, sns)
+
+    for name in n.model_extra_constraints:
+        m.remove_constraints(name)
+    constraints = set(m.constraints)
+    extra_functionality_linopy(n, sns)
+    n.model_extra_constraints = set(m.constraints) - constraints
+
+
+def solve_persistent(n, config, profile=None):
+    """ Solves the network with a persistent linopy model.
+
+    The model is built on the first call and whenever the model structure
+    changed (e.g. assets becoming non-extendable). Otherwise, only the changed
+    values are written into the existing model before it is solved again.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object to optimize.
+    config : dict
+        The model configuration (content of config.yaml).
+    profile : list, optional
+        Records of the run profile (see solve_network).
+
+    Returns:
+    --------
+    tuple of str
+        The solver status and termination condition.
+    """
+    solver_name, solver_options = solver_settings(config)
+    options = config['solving'].get('options', {})
+    tmpdir = config['solving'].get('tmpdir') or tempfile.gettempdir()
+    year = config.get('year')
+
+    with pf.stage(profile, 'lopf_build', year):
+        if getattr(n, 'model', None) is None or n.model_structure != structure_key(n):
+            build_persistent_model(n)
+        else:
+            logger.info("Updating persistent model")
+            update_persistent_model(n)
+
+    kwargs = {'io_api': options.get('io_api'), **_linopy_basis_kwargs(n, options, tmpdir)}
+
+    with pf.lopf_phases(profile, year, solver_name, backend='persistent'):
+        return n.optimize.solve_model(solver_name=solver_name,
+                                      solver_options=solver_options,
+                                      **kwargs)
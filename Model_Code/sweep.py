@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+© Anas Abuzayed 2025
+
+This module runs scenario sweeps: a grid of scenario settings is expanded
+into independent myopic runs, which are solved in parallel on a process
+pool, and their yearly bar tables are combined into one result.
+"""
+
+import os
+import itertools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Environment variables limiting the threads of numerical libraries
+THREAD_VARS = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS']
+
+# Bar tables combined over all runs of a sweep
+BAR_TABLES = {'gen_bar': 'Generation', 'inst_bar': 'Installation', 'store_bar': 'Storage'}
+
+
+def expand_grid(parameters):
+    """ Expands a parameter grid into the overrides of the single runs.
+
+    Parameters:
+    -----------
+    parameters : dict
+        Maps parameter names to the list of values to combine. Names without
+        a dot refer to the scenario settings (e.g. 'H2_import'), other names
+        are dotted config keys (e.g. 'solving.options.warmstart').
+
+    Returns:
+    --------
+    list of dict
+        The overrides of every combination, keyed by dotted config keys.
+    """
+    keys = [key if '.' in key else f"scenario_settings.{key}" for key in parameters]
+    values = [v if isinstance(v, list) else [v] for v in parameters.values()]
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+
+def thread_budget(n_runs, workers=None, threads_per_run=None):
+    """ Splits the available cores between parallel runs.
+
+    Parameters:
+    -----------
+    n_runs : int
+        Number of runs of the sweep.
+    workers : int, optional
+        Number of parallel runs. Default is as many as fit on the cores.
+    threads_per_run : int, optional
+        Solver threads of every run. Default is the cores divided by the
+        number of workers.
+
+    Returns:
+    --------
+    tuple of int
+        The number of workers and the threads of every run, chosen such
+        that workers * threads does not exceed the available cores.
+    """
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') \
+        else os.cpu_count()
+    if workers is None:
+        workers = max(1, cores // (threads_per_run or 1))
+    workers = max(1, min(workers, n_runs, cores))
+    threads = max(1, min(threads_per_run or cores, cores // workers))
+    return workers, threads
+
+
+def _run_case(kwargs):
+    """ Runs one case of the sweep in a worker process. """
+    import Model
+    try:
+        return Model.main(**kwargs), None
+    except Exception as e:
+        logger.exception(f"Sweep run in {kwargs['output_dir']} failed")
+        return None, repr(e)
+
+
+def run_sweep(config, parameters, output_dir, clusters=None, end_year=2050,
+              workers=None, threads_per_run=None):
+    """ Runs a scenario sweep and combines the bar tables of all runs.
+
+    Every run gets its own folder '<output_dir>/run<k>'; the settings of the
+    runs are listed in '<output_dir>/Sweep_cases.csv'. Runs that fail are
+    logged and left out of the combined tables.
+
+    Parameters:
+    -----------
+    config : dict
+        The base configuration.
+    parameters : dict
+        The parameter grid, see expand_grid.
+    output_dir : str
+        Folder of the sweep.
+    clusters : int, optional
+        Number of clusters of all runs.
+    end_year : int, optional
+        Last year of all runs.
+    workers : int, optional
+        Number of parallel runs, see thread_budget.
+    threads_per_run : int, optional
+        Solver threads of every run, see thread_budget.
+
+    Returns:
+    --------
+    dict
+        The combined bar tables ('gen_bar', 'inst_bar', 'store_bar'),
+        indexed by run and year, and the table of the run settings ('cases').
+    """
+    cases = expand_grid(parameters)
+    workers, threads = thread_budget(len(cases), workers, threads_per_run)
+    logger.info(f"Sweep of {len(cases)} runs on {workers} workers with {threads} threads each")
+
+    os.makedirs(output_dir, exist_ok=True)
+    names = [f"run{k:03d}" for k in range(len(cases))]
+    table = pd.DataFrame([{key: str(value) for key, value in case.items()} for case in cases],
+                         index=pd.Index(names, name='run'))
+    table['status'] = 'pending'
+    table.to_csv(f"{output_dir}/Sweep_cases.csv")
+
+    jobs = {}
+    for name, case in zip(names, cases):
+        overrides = dict(case)
+        overrides['solving.solver.threads'] = threads
+        jobs[name] = dict(config=config, clusters=clusters, end_year=end_year,
+                          output_dir=f"{output_dir}/{name}", overrides=overrides)
+
+    # Workers inherit the thread limits of the numerical libraries
+    saved_env = {var: os.environ.get(var) for var in THREAD_VARS}
+    os.environ.update({var: str(threads) for var in THREAD_VARS})
+    results = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(_run_case, job): name for name, job in jobs.items()}
+            for future in as_completed(futures):
+                name = futures[future]
+                result, error = future.result()
+                if error is None:
+                    results[name] = result
+                    table.loc[name, 'status'] = 'done'
+                    logger.info(f"Sweep run {name} finished")
+                else:
+                    table.loc[name, 'status'] = error
+                    logger.warning(f"Sweep run {name} failed: {error}")
+    finally:
+        for var, value in saved_env.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+    table.to_csv(f"{output_dir}/Sweep_cases.csv")
+    combined = {'cases': table}
+    for key, bar_type in BAR_TABLES.items():
+        frames = {name: results[name][key] for name in names if name in results}
+        if not frames:
+            continue
+        combined[key] = pd.concat(frames, names=['run', 'year'])
+        combined[key].to_csv(f"{output_dir}/Sweep_{bar_type}_Bar.csv")
+    return combined
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+© Anas Abuzayed 2025
+
+This module aggregates the snapshots of the network before the myopic
+optimization, following the time resolution token of the opts:
+    '<N>H'    : uniform resampling to N-hourly snapshots (e.g. 24H)
+    '<k>days' : k representative days chosen by clustering the daily
+                profiles, weighted by the number of days they represent
+
+The snapshots stay in chronological order and the storage weightings keep
+the real duration of a snapshot, so that the state of charge chaining
+between the years (initial_storage) and the empty store at the last
+snapshot (e_max_pu) work unchanged on the aggregated network.
+"""
+
+import re
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def aggregate_snapshots(n, opts):
+    """ Aggregates the snapshots of the network following the opts.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object, aggregated in place.
+    opts : list of str
+        The opts tokens of the scenario settings.
+
+    Returns:
+    --------
+    None
+    """
+    for o in opts:
+        m = re.match(r'^(\d+)h$', o, re.IGNORECASE)
+        if m is not None:
+            resample_snapshots(n, int(m.group(1)))
+            return
+        m = re.match(r'^(\d+)days$', o, re.IGNORECASE)
+        if m is not None:
+            cluster_snapshots(n, int(m.group(1)))
+            return
+
+
+def resample_snapshots(n, hours):
+    """ Resamples the network to uniform N-hourly snapshots.
+
+    Time series are averaged over each period, the snapshot weightings are
+    summed, so that energies, costs and storage durations are preserved.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object, resampled in place.
+    hours : int
+        The length of the new snapshots in hours.
+
+    Returns:
+    --------
+    None
+    """
+    offset = f"{hours}h"
+    step = (n.snapshots[1] - n.snapshots[0]) / pd.Timedelta('1h')
+    if step >= hours:
+        return
+
+    weightings = n.snapshot_weightings.resample(offset).sum()
+    series = {c.name: {attr: df.resample(offset).mean()
+                       for attr, df in c.pnl.items() if not df.empty}
+              for c in n.iterate_components()}
+
+    n.set_snapshots(weightings.index)
+    n.snapshot_weightings = weightings
+    for component, attrs in series.items():
+        for attr, df in attrs.items():
+            n.pnl(component)[attr] = df
+    logger.info(f"Resampled the snapshots to {hours}H: {len(n.snapshots)} snapshots")
+
+
+def cluster_snapshots(n, days, max_iter=100):
+    """ Reduces the network to representative days.
+
+    The daily profiles of renewable availability, load and inflow are
+    clustered (k-means), and of every cluster the day closest to its centre
+    is kept. The objective and generator weightings of a representative day
+    are scaled by the number of days it represents; the storage weightings
+    keep the duration of the snapshots.
+
+    Parameters:
+    -----------
+    n : Network
+        The network object, reduced in place.
+    days : int
+        The number of representative days.
+    max_iter : int, optional
+        The maximum number of k-means iterations. Default is 100.
+
+    Returns:
+    --------
+    None
+    """
+    day_of = pd.Series(n.snapshots.normalize(), index=n.snapshots)
+    per_day = day_of.value_counts()
+    full_days = per_day.index[per_day == per_day.max()].sort_values()
+    if days >= len(full_days):
+        return
+
+    frames = [n.generators_t.p_max_pu, n.loads_t.p_set, n.storage_units_t.inflow]
+    data = pd.concat([df / df.abs().max().replace(0, 1) for df in frames if not df.empty],
+                     axis=1).fillna(0)
+    data = data[day_of.isin(full_days).values]
+    features = data.values.reshape(len(full_days), -1)
+
+    medoids, counts = _representative_periods(features, days, max_iter)
+    counts = pd.Series(counts, index=full_days[medoids])
+
+    weightings = n.snapshot_weightings.copy()
+    snapshots = n.snapshots[day_of.isin(counts.index).values]
+    scale = day_of[snapshots].map(counts).values
+    new = weightings.loc[snapshots].copy()
+    for col in new.columns.intersection(['objective', 'generators']):
+        new[col] *= scale
+        new[col] *= weightings[col].sum() / new[col].sum()
+
+    n.set_snapshots(snapshots)
+    n.snapshot_weightings = new
+    logger.info(f"Clustered the snapshots to {days} representative days: "
+                f"{len(n.snapshots)} snapshots")
+
+
+def _representative_periods(features, k, max_iter):
+    """ Clusters the periods (rows) with k-means and returns the medoids.
+
+    The initial centres are chosen deterministically (farthest point), so
+    the same network always gives the same representative periods.
+
+    Returns:
+    --------
+    np.ndarray
+        The row numbers of the representative periods, in ascending order.
+    np.ndarray
+        The number of periods each of them represents.
+    """
+    norms = (features ** 2).sum(axis=1)
+
+    def distances(centres):
+        return norms[:, None] - 2 * features @ centres.T + (centres ** 2).sum(axis=1)[None, :]
+
+    first = np.argmin(((features - features.mean(axis=0)) ** 2).sum(axis=1))
+    chosen = [first]
+    for _ in range(k - 1):
+        chosen.append(np.argmax(distances(features[chosen]).min(axis=1)))
+    centres = features[chosen]
+
+    for _ in range(max_iter):
+        labels = distances(centres).argmin(axis=1)
+        new = np.array([features[labels == c].mean(axis=0) if (labels == c).any()
+                        else centres[c] for c in range(k)])
+        if np.allclose(new, centres):
+            break
+        centres = new
+
+    d = distances(centres)
+    labels = d.argmin(axis=1)
+    medoids = np.array([np.where(labels == c)[0][d[labels == c, c].argmin()]
+                        for c in range(k) if (labels == c).any()])
+    counts = np.bincount(labels, minlength=k)[labels[medoids]]
+    order = np.argsort(medoids)
+    return medoids[order], counts[order]
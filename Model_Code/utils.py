@@ -7,43 +7,119 @@ model.
 """
 
 
+import os
+import copy
+import logging
 import numpy as np
 import pandas as pd
 
+logger = logging.getLogger(__name__)
 
-def calculate_nearest_bus(data, a, n):
+
+def calculate_nearest_bus(data, a, n, chunk_size=10000):
     """
     Calculate the nearest bus for each entry in data using Haversine formula.
 
+    Only the buses that hold a generator of the carrier of an entry are
+    candidates. The distances are computed per carrier for chunks of entries
+    against all candidate buses at once; ties go to the first bus in a.
+    Entries of a carrier without any candidate bus get no bus (NaN), and a
+    warning lists those carriers.
+
     Parameters:
     data : DataFrame
-        Data containing 'latitude' and 'longitude' columns, (in radians)
+        Data containing 'carrier', 'latitude' and 'longitude' columns, (in radians)
     a : DataFrame
         DataFrame containing 'x', 'y', and 'bus' columns with bus coordinates, (in radians)
     n : Network
         The network object, used to filter out only relevant buses for the given carrier.
+    chunk_size : int, optional
+        Number of entries whose distances are computed at once. Default is 10000.
 
     Returns:
     pd.Series
         A series containing the nearest bus for each location.
     """
     R = 6371  # mean earth radius in km
-    buses = []
-    for j in range(len(data)):
-        distances = []
-        wanted_buses = list(n.generators.bus[n.generators.carrier == data.carrier[j]])
-        for i in range(len(a)):
-            distance = np.arccos(np.sin(a.y[i]) * np.sin(data.latitude[j]) + np.cos(a.y[i]) *
-                                 np.cos(data.latitude[j]) * np.cos(a.x[i] - data.longitude[j])) * R
-            distances.append(distance)
-        
-        df = pd.DataFrame({'bus': a.bus, 'distance': distances})
-        
-        # Keep only wanted buses for the specific carrier
-        df = df[df['bus'].isin(wanted_buses)]
-        df.index = range(len(df))
-        
-        # Find the nearest bus
-        buses.append(df.bus[np.argmin(df.distance)])
-    
+    latitude = data.latitude.values[:, None]
+    longitude = data.longitude.values[:, None]
+    bus_x, bus_y, bus_names = a.x.values, a.y.values, a.bus.values
+    carriers = pd.Series(data.carrier.values)
+
+    buses = np.full(len(data), np.nan, dtype=object)
+    for carrier, rows in carriers.groupby(carriers, sort=False).indices.items():
+        wanted_buses = n.generators.bus[n.generators.carrier == carrier]
+        candidates = np.flatnonzero(np.isin(bus_names, wanted_buses))
+        if candidates.size == 0:
+            continue
+        x, y = bus_x[candidates], bus_y[candidates]
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            with np.errstate(invalid='ignore'):
+                distances = np.arccos(np.sin(y) * np.sin(latitude[chunk]) + np.cos(y) *
+                                      np.cos(latitude[chunk]) * np.cos(x - longitude[chunk])) * R
+            buses[chunk] = bus_names[candidates[np.argmin(distances, axis=1)]]
+
+    unmatched = carriers[pd.isnull(buses)]
+    if not unmatched.empty:
+        logger.warning("No bus with a generator of carrier(s) "
+                       + ", ".join(f"{c} ({k} entries)" for c, k in
+                                   unmatched.value_counts(dropna=False).items())
+                       + ", these entries are not mapped to a bus")
+
     return pd.Series(buses)
+
+
+def to_csv_atomic(df, path, **kwargs):
+    """
+    Write a DataFrame to csv without exposing a partially written file.
+
+    The file is first written under a name unique to the process and then
+    moved in place, so that concurrent runs sharing the same network folder
+    never read a half-written file.
+
+    Parameters:
+    df : DataFrame
+        The data to write.
+    path : str
+        The target csv file.
+    **kwargs
+        Passed on to DataFrame.to_csv.
+
+    Returns:
+    None
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    df.to_csv(tmp, **kwargs)
+    os.replace(tmp, path)
+
+
+def apply_overrides(config, overrides):
+    """
+    Return a copy of the configuration with scenario overrides applied.
+
+    Parameters:
+    config : dict
+        The configuration as read from config.yaml.
+    overrides : dict
+        Maps dotted keys (e.g. 'scenario_settings.H2_import') to new values.
+        Numeric keys of dictionaries keyed by integers, such as the clusters
+        in 'scenario_settings.regional_potential.4', are used as integers.
+
+    Returns:
+    dict
+        The updated configuration; the input is left untouched.
+    """
+    config = copy.deepcopy(config)
+    for dotted, value in (overrides or {}).items():
+        node = config
+        keys = dotted.split('.')
+        for i, key in enumerate(keys):
+            if key not in node and key.lstrip('-').isdigit() \
+                    and any(isinstance(k, int) for k in node):
+                key = int(key)
+            if i == len(keys) - 1:
+                node[key] = value
+            else:
+                node = node.setdefault(key, {})
+    return config
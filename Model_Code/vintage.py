@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+© Anas Abuzayed 2025
+
+This module keeps the vintage ledger of the myopic optimization: every
+capacity added to the network (generators, gas links, storage units, H2
+links and H2 stores) is recorded with its bus, capacity, year added and
+year removed. The ledger is held in preallocated NumPy arrays with an index
+of the rows by retirement year, so that appending the additions of a year
+does not copy the ledger and the capacities retiring in a year are found
+without scanning all rows.
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Component types of the ledger (the former df, df_stor, df_H2 and df_H2_store)
+COMPONENTS = ['generation', 'storage_unit', 'H2_link', 'H2_store']
+
+# Columns of the exported tables (layout of addition.xlsx)
+COLUMNS = ['bus', 'p_nom', 'year_added', 'year_removed']
+
+
+def new_ledger(capacity=4096):
+    """ Creates an empty vintage ledger.
+
+    Parameters:
+    -----------
+    capacity : int, optional
+        Number of rows preallocated. The ledger grows by doubling if more
+        rows are added. Default is 4096.
+
+    Returns:
+    --------
+    dict
+        The ledger: the row arrays, the number of used rows ('size') and the
+        row positions by retirement year ('retiring').
+    """
+    return {'size': 0,
+            'name': np.empty(capacity, dtype=object),
+            'component': np.empty(capacity, dtype=np.int8),
+            'bus': np.empty(capacity, dtype=object),
+            'p_nom': np.empty(capacity, dtype=float),
+            'year_added': np.empty(capacity, dtype=np.int64),
+            'year_removed': np.empty(capacity, dtype=np.int64),
+            'retiring': {}}
+
+
+def _reserve(ledger, rows):
+    """ Makes room for rows more rows, doubling the arrays if needed. """
+    capacity = len(ledger['name'])
+    needed = ledger['size'] + rows
+    if needed <= capacity:
+        return
+    while capacity < needed:
+        capacity *= 2
+    for key in ['name', 'component', 'bus', 'p_nom', 'year_added', 'year_removed']:
+        grown = np.empty(capacity, dtype=ledger[key].dtype)
+        grown[:ledger['size']] = ledger[key][:ledger['size']]
+        ledger[key] = grown
+
+
+def add(ledger, component, names, bus, p_nom, year_added, year_removed):
+    """ Appends assets to the ledger.
+
+    Parameters:
+    -----------
+    ledger : dict
+        The vintage ledger, updated in place.
+    component : str
+        The component type of the assets, one of COMPONENTS.
+    names : list-like
+        The names of the assets in the network.
+    bus : list-like or scalar
+        The buses of the assets.
+    p_nom : list-like or scalar
+        The added capacities.
+    year_added : list-like or scalar
+        The years the capacities were added.
+    year_removed : list-like or scalar
+        The years the capacities retire.
+
+    Returns:
+    --------
+    None
+    """
+    names = np.asarray(names, dtype=object)
+    rows = len(names)
+    if rows == 0:
+        return
+    _reserve(ledger, rows)
+    start = ledger['size']
+    pos = np.arange(start, start + rows)
+
+    ledger['name'][pos] = names
+    ledger['component'][pos] = COMPONENTS.index(component)
+    ledger['bus'][pos] = np.broadcast_to(np.asarray(bus, dtype=object), rows)
+    ledger['p_nom'][pos] = np.broadcast_to(np.asarray(p_nom, dtype=float), rows)
+    ledger['year_added'][pos] = np.broadcast_to(np.asarray(year_added), rows)
+    removed = np.broadcast_to(np.asarray(year_removed), rows).astype(np.int64)
+    ledger['year_removed'][pos] = removed
+    ledger['size'] = start + rows
+
+    for year in np.unique(removed):
+        ledger['retiring'].setdefault(int(year), []).append(pos[removed == year])
+
+
+def add_frame(ledger, component, df):
+    """ Appends the assets of a tracking table to the ledger.
+
+    Parameters:
+    -----------
+    ledger : dict
+        The vintage ledger, updated in place.
+    component : str
+        The component type of the assets, one of COMPONENTS.
+    df : pd.DataFrame
+        Table indexed by asset name with the columns p_nom, year_added,
+        year_removed and optionally bus.
+
+    Returns:
+    --------
+    None
+    """
+    add(ledger, component, df.index,
+        df['bus'].values if 'bus' in df.columns else None,
+        df.p_nom.values, df.year_added.values, df.year_removed.values)
+
+
+def _frame(ledger, pos):
+    """ Returns the rows at the positions pos in the layout of addition.xlsx. """
+    return pd.DataFrame({'bus': ledger['bus'][pos],
+                         'p_nom': ledger['p_nom'][pos],
+                         'year_added': ledger['year_added'][pos],
+                         'year_removed': ledger['year_removed'][pos]},
+                        index=pd.Index(ledger['name'][pos]), columns=COLUMNS)
+
+
+def retiring(ledger, component, year):
+    """ Returns the assets of a component type that retire in a year.
+
+    Parameters:
+    -----------
+    ledger : dict
+        The vintage ledger.
+    component : str
+        The component type, one of COMPONENTS.
+    year : int
+        The retirement year.
+
+    Returns:
+    --------
+    pd.DataFrame
+        The retiring assets in the order they were added, indexed by name
+        with the columns bus, p_nom, year_added and year_removed.
+    """
+    buckets = ledger['retiring'].get(int(year), [])
+    pos = np.concatenate(buckets) if buckets else np.empty(0, dtype=np.int64)
+    pos = pos[ledger['component'][pos] == COMPONENTS.index(component)]
+    return _frame(ledger, pos)
+
+
+def to_frame(ledger, component):
+    """ Returns all assets of a component type.
+
+    Parameters:
+    -----------
+    ledger : dict
+        The vintage ledger.
+    component : str
+        The component type, one of COMPONENTS.
+
+    Returns:
+    --------
+    pd.DataFrame
+        The assets in the order they were added, indexed by name with the
+        columns bus, p_nom, year_added and year_removed.
+    """
+    size = ledger['size']
+    pos = np.flatnonzero(ledger['component'][:size] == COMPONENTS.index(component))
+    return _frame(ledger, pos)
+
+
+def export_additions(ledger, path):
+    """ Writes the generation additions of the run to an Excel file.
+
+    Parameters:
+    -----------
+    ledger : dict
+        The vintage ledger.
+    path : str
+        The file to write, e.g. '<results>/addition.xlsx'.
+
+    Returns:
+    --------
+    pd.DataFrame
+        The exported table.
+    """
+    df = to_frame(ledger, 'generation')
+    df.to_excel(path, index=True)
+    return df
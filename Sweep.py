@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+© Anas Abuzayed 2025
+
+This script runs a scenario sweep of the myopic model:
+    Every combination of the parameter values in the 'sweep' section of the
+    configuration is solved as an independent run (see Model.py). The runs
+    are executed in parallel and their bar tables are combined into
+    Sweep_<type>_Bar.csv files in the sweep folder.
+"""
+
+import argparse
+import logging
+import yaml
+
+import Model_Code.sweep as sw
+
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a MyPyPSA-Ger scenario sweep.")
+    parser.add_argument("--config", default="config.yaml",
+                        help="configuration file with a 'sweep' section (default: config.yaml)")
+    parser.add_argument("--clusters", type=int,
+                        help="number of clusters (default: scenario_settings.clusters)")
+    parser.add_argument("--end-year", type=int, default=2050, metavar="YEAR",
+                        help="last year of the myopic optimization (default: 2050)")
+    parser.add_argument("--output-dir", default="Results/sweep",
+                        help="sweep folder (default: Results/sweep)")
+    parser.add_argument("--workers", type=int,
+                        help="parallel runs (default: sweep.workers)")
+    parser.add_argument("--threads-per-run", type=int,
+                        help="solver threads of every run (default: sweep.threads_per_run)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with open(args.config, "r") as file:
+        config = yaml.load(file, Loader=yaml.FullLoader)
+    sweep = config.get('sweep', {})
+
+    sw.run_sweep(config, sweep.get('parameters', {}), args.output_dir,
+                 clusters=args.clusters, end_year=args.end_year,
+                 workers=args.workers or sweep.get('workers'),
+                 threads_per_run=args.threads_per_run or sweep.get('threads_per_run'))
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+© Anas Abuzayed 2025
+
+Parity of the legacy LOPF ('lopf') and the linopy n.optimize ('optimize')
+backends of Model_Code/solving.py, with the battery, hydrogen and CCL
+constraints of Model_Code/Constraints.py on a small network.
+"""
+
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pypsa = pytest.importorskip("pypsa")
+linopy = pytest.importorskip("linopy")
+pytest.importorskip("pypsa.linopf")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Model_Code.solving as sv  # noqa: E402
+
+# Solvers usable by both backends: linopy name -> executable of the legacy LOPF
+SOLVERS = {'highs': 'highs', 'cbc': 'cbc', 'glpk': 'glpsol'}
+
+
+def _solver():
+    for name, executable in SOLVERS.items():
+        if name in linopy.available_solvers and shutil.which(executable):
+            return name
+    pytest.skip("no solver available to both backends")
+
+
+def _network(limits_fn):
+    n = pypsa.Network()
+    n.set_snapshots(pd.date_range('2013-01-01', periods=24, freq='h'))
+    rng = np.random.default_rng(0)
+    buses = ['DE0 0', 'DE0 1']
+    for bus in buses:
+        n.add('Bus', bus, carrier='AC')
+        n.add('Bus', f'{bus} gas', carrier='gas')
+        n.add('Bus', f'{bus} H2', carrier='H2')
+        n.add('Bus', f'{bus} battery', carrier='battery')
+        n.add('Generator', f'{bus} gas', bus=f'{bus} gas', carrier='gas',
+              p_nom=1e5, marginal_cost=60)
+        for carrier in ['solar', 'onwind']:
+            n.add('Generator', f'{bus} {carrier}', bus=bus, carrier=carrier,
+                  p_nom_extendable=True, p_nom_max=3000, capital_cost=5000,
+                  p_max_pu=rng.random(24))
+        n.add('Link', f'{bus} CCGT', bus0=f'{bus} gas', bus1=bus, carrier='CCGT',
+              efficiency=0.61, p_nom=500, p_nom_extendable=True, capital_cost=6000)
+        n.add('Link', f'{bus} electrolysis', bus0=bus, bus1=f'{bus} H2',
+              carrier='electrolysis', efficiency=0.8, p_nom_extendable=True,
+              capital_cost=1400)
+        n.add('Link', f'{bus} fuel cell', bus0=f'{bus} H2', bus1=bus,
+              carrier='fuel cell', efficiency=0.58, p_nom_extendable=True,
+              capital_cost=950)
+        n.add('Store', f'{bus} H2', bus=f'{bus} H2', carrier='H2',
+              e_nom_extendable=True, capital_cost=2.64)
+        n.add('Link', f'{bus} battery charger', bus0=bus, bus1=f'{bus} battery',
+              carrier='battery charger', efficiency=0.95, p_nom_extendable=True,
+              capital_cost=100)
+        n.add('Link', f'{bus} battery discharger', bus0=f'{bus} battery', bus1=bus,
+              carrier='battery discharger', efficiency=0.95, p_nom_extendable=True,
+              capital_cost=100)
+        n.add('Store', f'{bus} battery', bus=f'{bus} battery', carrier='battery',
+              e_nom_extendable=True, e_cyclic=True, capital_cost=150)
+        n.add('Load', bus, bus=bus, p_set=1500 + 500 * rng.random(24))
+    n.add('Line', 'DE0 0 - DE0 1', bus0=buses[0], bus1=buses[1], x=0.1, s_nom=800)
+
+    # the CCL limits are binding for onwind and solar
+    pd.DataFrame({'country': 'DE', 'carrier': ['onwind', 'solar', 'electrolysis'],
+                  'min': np.nan, 'max': [2500, 1200, 400]}).to_csv(limits_fn, index=False)
+    n.opts = ['CCL']
+    n.config = {'scenario_settings': {'agg_p_nom_limits': str(limits_fn)}, 'year': 2020}
+    return n
+
+
+def test_backends_match(tmp_path):
+    n = _network(tmp_path / 'agg_p_nom_minmax.csv')
+    config = {'year': 2020,
+              'solving': {'solver': {'name': _solver()},
+                          'options': {}, 'tmpdir': str(tmp_path)}}
+
+    parity = sv.compare_backends(n, config, rtol=1e-4)
+
+    assert parity.match.all(), parity.to_string()
+    assert parity.loc['objective', 'lopf'] > 0
+    assert parity.loc['Generator p_nom_opt', 'lopf'] > 0
+
+
+def test_constraints_hold_in_both_backends(tmp_path):
+    n = _network(tmp_path / 'agg_p_nom_minmax.csv')
+    solver = _solver()
+    for backend in ['lopf', 'optimize']:
+        m = n.copy()
+        m.opts, m.config = n.opts, n.config
+        config = {'year': 2020,
+                  'solving': {'solver': {'name': solver},
+                              'options': {'backend': backend}, 'tmpdir': str(tmp_path)}}
+        status, _ = sv.solve_network(m, config)
+        assert status == 'ok', backend
+
+        links, stores = m.links.p_nom_opt, m.stores.e_nom_opt
+        for bus in ['DE0 0', 'DE0 1']:
+            # H2 store to fuel cell and electrolysis ratios
+            assert np.isclose(stores[f'{bus} H2'], 168 * 0.58 * links[f'{bus} fuel cell'],
+                              rtol=1e-4, atol=1e-3), backend
+            assert np.isclose(stores[f'{bus} H2'], 168 * links[f'{bus} electrolysis'],
+                              rtol=1e-4, atol=1e-3), backend
+            # battery charger to discharger ratio
+            assert np.isclose(links[f'{bus} battery charger'],
+                              0.95 * links[f'{bus} battery discharger'],
+                              rtol=1e-4, atol=1e-3), backend
+        # aggregate capacity limits
+        generators = m.generators.p_nom_opt.groupby(m.generators.carrier).sum()
+        assert generators['onwind'] <= 2500 + 1e-3, backend
+        assert generators['solar'] <= 1200 + 1e-3, backend